@@ -0,0 +1,80 @@
+"""JSON API served from the Flask app behind the dashboard (``app.server``)."""
+import json
+
+from flask import Response, jsonify, request
+
+from batch import evaluate_households, household_bill_summary
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def _parse_households(body, ndjson):
+    if ndjson:
+        # One json.loads over the whole body is much faster than one per line
+        lines = [line for line in body.splitlines() if line.strip()]
+        try:
+            households = json.loads('[' + ','.join(lines) + ']')
+        except json.JSONDecodeError:
+            return [json.loads(line) for line in lines]  # raises for the first bad line
+        if len(households) != len(lines):
+            raise ValueError("Each NDJSON line must hold exactly one household.")
+        return households
+
+    data = json.loads(body)
+    if isinstance(data, dict):
+        data = data.get('households')
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of households or an object with a 'households' list.")
+    return data
+
+
+def register_api(server, data_registry):
+    """Adds the /api/v1 routes to a Flask server.
+
+    POST /api/v1/evaluate takes a batch of households, either as a JSON list
+    (or {"households": [...]}) or as NDJSON with one household per line, and
+    returns per-plan costs and emissions for each household, in columns per
+    group of households sharing a plan set (see batch.evaluate_households).
+    NDJSON requests (or requests that accept NDJSON) get a streamed NDJSON
+    response with one group per line, everything else gets
+    {"groups": [...]}. Invalid input gets a 400. Each request reads the
+    current snapshot of ``data_registry`` (see data_registry.py).
+
+    POST /api/v1/bills takes one household (a JSON object with the same
+    fields) and returns its monthly and annual bills from the hourly
+    simulation (see batch.household_bill_summary), or a 404 if its ZIP has
+    no plans.
+    """
+    @server.route('/api/v1/evaluate', methods=['POST'])
+    def evaluate():
+        ndjson_in = request.mimetype == NDJSON_MIMETYPE
+        ndjson_out = ndjson_in or request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+        try:
+            households = _parse_households(request.get_data(as_text=True), ndjson_in)
+            # Validate the whole batch up front so a bad row fails the request
+            # instead of truncating a streamed response
+            data = data_registry.get()
+            groups = list(evaluate_households(households, data.plan_catalog,
+                                              data.gas_base_price, data.gas_excess_price))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if ndjson_out:
+            return Response((group + '\n' for group in groups), mimetype=NDJSON_MIMETYPE)
+        return Response('{"groups": [' + ', '.join(groups) + ']}', mimetype='application/json')
+
+    @server.route('/api/v1/bills', methods=['POST'])
+    def bills():
+        try:
+            household = json.loads(request.get_data(as_text=True))
+            if not isinstance(household, dict):
+                raise ValueError("Expected a household object.")
+            data = data_registry.get()
+            summary = household_bill_summary(household, data.plan_catalog, data.tariffs, data.gas_tariff)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if summary is None:
+            return jsonify({'error': "No plans found for ZIP code."}), 404
+        return jsonify(summary)
@@ -2,16 +2,20 @@ import dash
 from dash import dcc, html, Input, Output, State
 import pandas as pd
 import plotly.graph_objects as go
-import json
 # (1) Add this import
 import requests
+import numpy as np
+
+from energy_calc import evaluate_plans, interleave
+from tariffs import load_tariffs, two_tier_prices
+from zip_plans import load_zip_plans
 
 # Load data
-with open('data/zip_to_plan.json', 'r') as file:
-    zip_to_plans = json.load(file)
+zip_to_plans = load_zip_plans()
 
 plan_details_df = pd.read_csv('data/plan_details.csv')
-gas_plan_details_df = pd.read_csv('data/gas_plan_details.csv')
+_, gas_tariff = load_tariffs(plan_details_df)
+gas_base_price, gas_excess_price = two_tier_prices(gas_tariff)
 
 app = dash.Dash(__name__)
 app.title = "Residential Electrification Dashboard"
@@ -156,80 +160,37 @@ def update_bar_and_dropdown(zip_code, kwh_usage, therms_usage, gas_allowance,
     available_plans = zip_to_plans[zip_code]
     plans = plan_details_df[plan_details_df['plan'].isin(available_plans)]
 
-    gas_emissions_factor = 5.3  # kg CO₂ per therm
-
     if plans.empty:
         return go.Figure(), [], None, f"No detailed plan information available for ZIP code {zip_code}."
     
     # Electrification Simulation
     if toggle:
-        # --- Convert to decimals ---
-        furnace_ratio /= 100
-        heater_ratio /= 100
-        electrification_pct /= 100
-        furnace_eff /= 100
-        heater_eff /= 100
-
-        # --- Calculate additional electricity usage and reduced gas ---
-        additional_kwh = therms_usage * electrification_pct * (
-            furnace_ratio * furnace_eff * 29.3 / cop +
-            heater_ratio * heater_eff * 29.3 / cop
-        )
-        reduced_gas = therms_usage * (1 - electrification_pct)
-        adjusted_kwh = kwh_usage + additional_kwh
+        if cop is None or cop <= 0:
+            return go.Figure(), [], None, "Heat pump COP must be positive."
 
         fig = go.Figure()
 
-        # --- Load prices ---
-        gas_base_price = gas_plan_details_df[gas_plan_details_df['plan'] == 'PG&E Baseline']['price_per_therm'].values[0]
-        gas_excess_price = gas_plan_details_df[gas_plan_details_df['plan'] == 'PG&E Excess']['price_per_therm'].values[0]
-
-        x_vals = []
-
-        elec_costs = []
-        gas_costs = []
-        emissions = []
-
-        elec_colors = []
-        gas_colors = []
-        emission_colors = []
-        emission_opacities = []
-
-        for plan in plans['plan']:
-            price_per_kwh = plans.loc[plans['plan'] == plan, 'price_per_kwh'].values[0]
-            emissions_factor = plans.loc[plans['plan'] == plan, 'emissions_g_per_kwh'].values[0]
-
-            # --- Original ---
-            gas_base_orig = gas_base_price * min(therms_usage, gas_allowance * 30)
-            gas_excess_orig = gas_excess_price * max(0, therms_usage - gas_allowance * 30)
-            gas_total_orig = gas_base_orig + gas_excess_orig
-            elec_cost_orig = price_per_kwh * kwh_usage
-            emissions_kg_orig = emissions_factor * kwh_usage / 1000
-
-            x_vals.append(plan + " (Original)")
-            elec_costs.append(elec_cost_orig)
-            gas_costs.append(gas_total_orig)
-            emissions.append(emissions_kg_orig)
-            elec_colors.append('lightblue')
-            gas_colors.append('moccasin')
-            emission_colors.append('lightcoral')
-            emission_opacities.append(0.8)
-
-            # --- Electrified ---
-            gas_base_elec = gas_base_price * min(reduced_gas, gas_allowance * 30)
-            gas_excess_elec = gas_excess_price * max(0, reduced_gas - gas_allowance * 30)
-            gas_total_elec = gas_base_elec + gas_excess_elec
-            elec_cost_elec = price_per_kwh * adjusted_kwh
-            emissions_kg_elec = emissions_factor * adjusted_kwh / 1000
-
-            x_vals.append(plan + " (Electrified)")
-            elec_costs.append(elec_cost_elec)
-            gas_costs.append(gas_total_elec)
-            emissions.append(emissions_kg_elec)
-            elec_colors.append('#3498db')
-            gas_colors.append('#e67e22')
-            emission_colors.append('#e74c3c')
-            emission_opacities.append(0.9)
+        # --- Costs and emissions for every plan (percentages -> decimals) ---
+        results = evaluate_plans(kwh_usage, therms_usage, gas_allowance,
+                                 plans['price_per_kwh'].values, plans['emissions_g_per_kwh'].values,
+                                 gas_base_price, gas_excess_price,
+                                 cop=cop,
+                                 furnace_eff=furnace_eff / 100,
+                                 heater_eff=heater_eff / 100,
+                                 furnace_ratio=furnace_ratio / 100,
+                                 heater_ratio=heater_ratio / 100,
+                                 electrification_pct=electrification_pct / 100)
+
+        # Each plan gets an "(Original)" bar followed by an "(Electrified)" bar
+        n_plans = len(plans)
+        plan_names = plans['plan'].values.astype(str)
+        x_vals = interleave(np.char.add(plan_names, " (Original)"),
+                            np.char.add(plan_names, " (Electrified)"))
+
+        elec_costs = interleave(results['elec_cost_orig'], results['elec_cost_elec'])
+        gas_costs = interleave(results['gas_cost_orig'], results['gas_cost_elec'])
+        elec_colors = ['lightblue', '#3498db'] * n_plans
+        gas_colors = ['moccasin', '#e67e22'] * n_plans
 
         # --- Add Electricity Bars ---
         fig.add_trace(go.Bar(
@@ -254,34 +215,12 @@ def update_bar_and_dropdown(zip_code, kwh_usage, therms_usage, gas_allowance,
         ))
 
         # Separate emissions
-        electric_emissions = []
-        gas_emissions = []
-
-        x_orig = []
-        x_elec = []
-
-        for plan in plans['plan']:
-            emissions_factor = plans.loc[plans['plan'] == plan, 'emissions_g_per_kwh'].values[0]
-
-            # Original emissions
-            elec_em_orig = emissions_factor * kwh_usage / 1000
-            gas_em_orig = gas_emissions_factor * therms_usage
-
-            x_orig.append(plan + " (Original)")
-            electric_emissions.append(elec_em_orig)
-            gas_emissions.append(gas_em_orig)
-
-            # Electrified emissions
-            elec_em_elec = emissions_factor * adjusted_kwh / 1000
-            gas_em_elec = gas_emissions_factor * reduced_gas
-
-            x_elec.append(plan + " (Electrified)")
-            electric_emissions.append(elec_em_elec)
-            gas_emissions.append(gas_em_elec)
+        electric_emissions = interleave(results['elec_emissions_orig'], results['elec_emissions_elec'])
+        gas_emissions = interleave(results['gas_emissions_orig'], results['gas_emissions_elec'])
 
         # Electricity Emissions Bar
         fig.add_trace(go.Bar(
-            x=x_orig + x_elec,
+            x=x_vals,
             y=electric_emissions,
             name='Electricity Emissions',
             marker_color='#e74c3c',
@@ -294,7 +233,7 @@ def update_bar_and_dropdown(zip_code, kwh_usage, therms_usage, gas_allowance,
 
         # Gas Emissions Bar
         fig.add_trace(go.Bar(
-            x=x_orig + x_elec,
+            x=x_vals,
             y=gas_emissions,
             name='Gas Emissions',
             marker_color='navajowhite',
@@ -400,16 +339,12 @@ def update_bar_and_dropdown(zip_code, kwh_usage, therms_usage, gas_allowance,
 
         fig = go.Figure()
 
-        gas_base_price = gas_plan_details_df[gas_plan_details_df['plan'] == 'PG&E Baseline']['price_per_therm'].values[0]
-        gas_excess_price = gas_plan_details_df[gas_plan_details_df['plan'] == 'PG&E Excess']['price_per_therm'].values[0]
+        results = evaluate_plans(kwh_usage, therms_usage, gas_allowance,
+                                 plans['price_per_kwh'].values, plans['emissions_g_per_kwh'].values,
+                                 gas_base_price, gas_excess_price)
 
-        electricity_costs = plans['price_per_kwh'] * kwh_usage
-        gas_base = gas_base_price * min(therms_usage, gas_allowance * 30)
-        gas_excess = gas_excess_price * max(0, therms_usage - gas_allowance * 30)
-        gas_total = gas_base + gas_excess
-
-        # Match gas cost to length of plans (assume same for all)
-        gas_costs = [gas_total] * len(plans)
+        electricity_costs = results['elec_cost_orig']
+        gas_costs = results['gas_cost_orig']
 
         # First: Electricity (bottom layer of stack)
         fig.add_trace(go.Bar(
@@ -433,9 +368,9 @@ def update_bar_and_dropdown(zip_code, kwh_usage, therms_usage, gas_allowance,
             offset=-0.2  # Align with electricity
         ))
 
-        # Calculate separate emissions
-        electric_emissions = plans['emissions_g_per_kwh'] * kwh_usage / 1000
-        gas_emissions = gas_emissions_factor * therms_usage
+        # Separate emissions
+        electric_emissions = results['elec_emissions_orig']
+        gas_emissions = results['gas_emissions_orig']
 
         # Add stacked emissions: Electricity
         fig.add_trace(go.Bar(
@@ -453,7 +388,7 @@ def update_bar_and_dropdown(zip_code, kwh_usage, therms_usage, gas_allowance,
         # Add stacked emissions: Gas
         fig.add_trace(go.Bar(
             x=plans['plan'],
-            y=[gas_emissions] * len(plans),
+            y=gas_emissions,
             name='Gas Emissions',
             marker_color='navajowhite',
             width=0.25,
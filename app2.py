@@ -1,20 +1,30 @@
 
 import dash
-from dash import dcc, html, Input, Output, State
+from dash import dcc, html, Input, Output, State, ClientsideFunction
 import dash_bootstrap_components as dbc
-import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
-import json
-import requests
 import calendar
+import functools
 import os
 
-# Load data
-with open('data/zip_to_energy_plans.json', 'r') as file:
-    zip_to_plans = json.load(file)
-
-plan_details_df = pd.read_csv('data/plan_details.csv')
-gas_plan_details_df = pd.read_csv('data/gas_plan_details.csv')
+from api import register_api
+from callback_cache import memoize_callback
+from metrics import instrument_callbacks, register_metrics, stage, wrap_callbacks
+from profiling import profiled_callback, register_profiling
+from energy_calc import DAYS_PER_MONTH, GAS_EMISSIONS_KG_PER_THERM, KWH_PER_THERM, evaluate_plans, interleave
+from load_profile import hourly_profile
+from net_metering import net_metering_bills
+from geocode import zip_to_latlon
+from solar import fetch_hourly_production, fetch_solar_potential
+from data_registry import registry
+from plan_catalog import plan_options
+from monte_carlo import electrification_monte_carlo, solar_monte_carlo
+from recommender import recommend
+from projection import ELECTRICITY_INFLATION, HORIZON_YEARS, UP_FRONT_COST, cumulative_costs, payback_year, sensitivity_grid
+
+# Recompute the bar charts in the browser instead of on the server (see update_plan_vectors)
+CLIENTSIDE_FIGURES = os.environ.get('CLIENTSIDE_FIGURES', '1') != '0'
 
 # Initialize the Dash app
 app = dash.Dash(__name__, 
@@ -24,6 +34,16 @@ app = dash.Dash(__name__,
 # App title
 app.title = "Electricity Rates Comparison Dashboard"
 
+# Batch household evaluation API (/api/v1/evaluate) on the underlying Flask server
+register_api(app.server, registry)
+
+# Latency, stage, cache and external API metrics for every callback, on /metrics
+instrument_callbacks(app)
+register_metrics(app.server)
+# Opt-in cProfile/sampling of selected callbacks, listed on /admin/profiles (see profiling.py)
+wrap_callbacks(app, profiled_callback)
+register_profiling(app.server)
+
 # Create app layout
 app.layout = html.Div([
     # Header
@@ -122,6 +142,14 @@ app.layout = html.Div([
             ], width=10)
         ])
     ], fluid=True, className="py-4"),
+
+    # Intermediate Solar tab results, so each stage only re-runs when its own inputs change
+    dcc.Store(id="solar-location-store"),
+    dcc.Store(id="solar-yield-store"),
+    dcc.Store(id="solar-offset-store"),
+
+    # Current ZIP's plan vectors for the browser-side bar charts
+    dcc.Store(id="plan-vectors-store"),
 ])
 
 # Callback to handle tab selection
@@ -163,6 +191,12 @@ def render_tab_content(active_tab):
                     'boxSizing': 'border-box'
                 }),
             ], style={'display': 'flex', 'flexWrap': 'wrap'}),
+
+            # Best plan / electrification / solar combinations for this household
+            html.Div(id='recommendation-panel', className="mt-4"),
+
+            # Uncertainty in long-term savings for the plan selected above
+            dcc.Graph(id='electrification_fan_chart', style={'height': '400px'}),
         ])
 
     
@@ -270,6 +304,12 @@ def render_tab_content(active_tab):
                     'boxSizing': 'border-box'
                 }),
             ], style={'display': 'flex', 'flexWrap': 'wrap'}),
+
+            # Best plan / electrification / solar combinations for this household
+            html.Div(id='recommendation-panel', className="mt-4"),
+
+            # Uncertainty in long-term savings for the plan selected above
+            dcc.Graph(id='electrification_fan_chart', style={'height': '400px'}),
         ])
     
     elif active_tab == "tab-solar":
@@ -369,6 +409,12 @@ def render_tab_content(active_tab):
 
             ], className="mb-4"),
             html.Div(id="solar-simulation-content", className="mt-4"),
+            html.H5("Hourly Net Metering"),
+            dcc.Dropdown(id='net_metering_input', options=list(registry.get().net_metering),
+                         value=next(iter(registry.get().net_metering), None), clearable=False,
+                         style={'width': '50%', 'fontSize': '13px'}),
+            html.Div(id="solar-net-metering-content", className="mt-4"),
+            html.Hr(),
             html.H5("Savings over the next 20 years (assuming 2% annual increase in electricity rates)"),
             dcc.Dropdown(id='plan_selector_solar', placeholder='Select a plan',
                                 style={'width': '50%', 'fontSize': '13px'}),
@@ -400,306 +446,250 @@ def update_dropdown(zip_code):
         return [], None
 
     zip_code = zip_code.strip()
+    data = registry.get()
 
-    if zip_code not in zip_to_plans:
+    if zip_code not in data.plan_catalog:
         return [], None
 
-    available_plans = zip_to_plans[zip_code]
-    plans = plan_details_df[plan_details_df['plan'].isin(available_plans)]
+    plans = data.plan_catalog[zip_code]
 
-    options = [{'label': plan, 'value': plan} for plan in plans['plan']]
-    default_value = plans['plan'].iloc[0]
+    return plan_options(plans)
 
-    return options, default_value
 
+def usage_triggered(*component_ids):
+    """True when the running callback was fired only by the given inputs.
 
-@app.callback(
-    Output('plan_comparison', 'figure'),
-    Input('zip_input', 'value'),
-    Input('kwh_input', 'value'),
-    Input('therms_input', 'value'),
-    Input('gas_allowance_input', 'value'),
-    Input("tabs", "active_tab")
-)
-def update_bar(zip_code, kwh_usage, therms_usage, gas_allowance, active_tab):
-    """Update the bar chart based on user inputs and selected tab."""
-    if not zip_code:
-        return go.Figure()
+    The figure on screen then already has the right plans and layout, so
+    only its values need to change. Outside a callback this is False.
+    """
+    try:
+        triggered = dash.ctx.triggered_prop_ids
+    except dash.exceptions.MissingCallbackContextException:
+        return False
+    return bool(triggered) and all(component_id in component_ids for component_id in triggered.values())
 
-    zip_code = zip_code.strip()
 
-    if zip_code not in zip_to_plans:
-        return go.Figure()
+def bar_patch(ys):
+    """Patch that replaces the y values of the four bar traces and rescales the emissions axis."""
+    patch = dash.Patch()
+    for i, y in enumerate(ys):
+        patch['data'][i]['y'] = y
+    patch['layout']['yaxis2']['range'] = [0, max(ys[2] + ys[3]) * 1.2]
+    return patch
 
-    available_plans = zip_to_plans[zip_code]
-    plans = plan_details_df[plan_details_df['plan'].isin(available_plans)]
 
-    gas_emissions_factor = 5.3  # kg CO₂ per therm
+@stage('figure')
+def base_bar_figure(zip_code, plans, results):
+    """Cost and emissions bar chart for the Base tab, one group of bars per plan."""
+    fig = go.Figure()
 
-    if plans.empty:
-        return go.Figure()
+    electricity_costs = results['elec_cost_orig']
+    gas_costs = results['gas_cost_orig']
 
-    elif active_tab == "tab-base":
+    elec_color_elec = '#1f77b4'      # Bold blue
+    gas_color_elec = '#ff7f0e'       # Bold orange
+    emission_color_elec = '#d62728'  # Strong red
+    emission_color_gas = '#f2c6a0'   # Soft tan
 
-        fig = go.Figure()
+    # First: Electricity (bottom layer of stack)
+    fig.add_trace(go.Bar(
+        x=plans['plan'],
+        y=electricity_costs,
+        name='Electricity Cost',
+        marker_color=elec_color_elec,
+        width=0.35,  # Slightly narrower to accommodate emissions bar
+        offsetgroup='costs',
+        offset=-0.2  # Shift left to make room for emissions
+    ))
 
-        gas_base_price = gas_plan_details_df[gas_plan_details_df['plan'] == 'PG&E Baseline']['price_per_therm'].values[0]
-        gas_excess_price = gas_plan_details_df[gas_plan_details_df['plan'] == 'PG&E Excess']['price_per_therm'].values[0]
-
-        electricity_costs = plans['price_per_kwh'] * kwh_usage
-        gas_base = gas_base_price * min(therms_usage, gas_allowance * 30)
-        gas_excess = gas_excess_price * max(0, therms_usage - gas_allowance * 30)
-        gas_total = gas_base + gas_excess
-
-        # Match gas cost to length of plans (assume same for all)
-        gas_costs = [gas_total] * len(plans)
-
-        elec_color_elec = '#1f77b4'      # Bold blue
-        gas_color_elec = '#ff7f0e'       # Bold orange
-        emission_color_elec = '#d62728'  # Strong red
-        emission_color_gas = '#f2c6a0'   # Soft tan
-
-        # First: Electricity (bottom layer of stack)
-        fig.add_trace(go.Bar(
-            x=plans['plan'],
-            y=electricity_costs,
-            name='Electricity Cost',
-            marker_color=elec_color_elec,
-            width=0.35,  # Slightly narrower to accommodate emissions bar
-            offsetgroup='costs',
-            offset=-0.2  # Shift left to make room for emissions
-        ))
+    # Second: Gas (stacked on top of electricity)
+    fig.add_trace(go.Bar(
+        x=plans['plan'],
+        y=gas_costs,
+        name='Gas Cost',
+        marker_color=gas_color_elec,
+        width=0.35,
+        offsetgroup='costs',
+        offset=-0.2  # Align with electricity
+    ))
 
-        # Second: Gas (stacked on top of electricity)
-        fig.add_trace(go.Bar(
-            x=plans['plan'],
-            y=gas_costs,
-            name='Gas Cost',
-            marker_color=gas_color_elec,
-            width=0.35,
-            offsetgroup='costs',
-            offset=-0.2  # Align with electricity
-        ))
+    # Separate emissions
+    electric_emissions = results['elec_emissions_orig']
+    gas_emissions = results['gas_emissions_orig']
 
-        # Calculate separate emissions
-        electric_emissions = plans['emissions_g_per_kwh'] * kwh_usage / 1000
-        gas_emissions = gas_emissions_factor * therms_usage
-
-        # Add stacked emissions: Electricity
-        fig.add_trace(go.Bar(
-            x=plans['plan'],
-            y=electric_emissions,
-            name='Electricity Emissions',
-            marker_color=emission_color_elec,
-            width=0.25,
-            offsetgroup='emissions',
-            offset=0.15,
-            opacity=0.85,
-            yaxis='y2'
-        ))
+    # Add stacked emissions: Electricity
+    fig.add_trace(go.Bar(
+        x=plans['plan'],
+        y=electric_emissions,
+        name='Electricity Emissions',
+        marker_color=emission_color_elec,
+        width=0.25,
+        offsetgroup='emissions',
+        offset=0.15,
+        opacity=0.85,
+        yaxis='y2'
+    ))
 
-        # Add stacked emissions: Gas
-        fig.add_trace(go.Bar(
-            x=plans['plan'],
-            y=[gas_emissions] * len(plans),
-            name='Gas Emissions',
-            marker_color=emission_color_gas,
-            width=0.25,
-            offsetgroup='emissions',
-            offset=0.15,
-            opacity=0.85,
-            yaxis='y2'
-        ))
+    # Add stacked emissions: Gas
+    fig.add_trace(go.Bar(
+        x=plans['plan'],
+        y=gas_emissions,
+        name='Gas Emissions',
+        marker_color=emission_color_gas,
+        width=0.25,
+        offsetgroup='emissions',
+        offset=0.15,
+        opacity=0.85,
+        yaxis='y2'
+    ))
 
-        # Update layout with improved readability
-        fig.update_layout(
-            title={
-                'text': f"Energy Rate Plans for ZIP {zip_code}",
-                'font': {'size': 22, 'family': 'Arial, sans-serif'}
-            },
-            barmode='stack',  # Stack electricity and gas bars
-            bargap=0.4,  # Increased gap between plan groups for clarity
-            bargroupgap=0.1,  # Space between bars in a group
-            yaxis=dict(
-                title={'text': 'Monthly Cost ($)', 'font': {'size': 16}},
-                side='left',
-                gridcolor='lightgray',
-                tickformat='$,.0f'  # Format as currency
-            ),
-            yaxis2=dict(
-                title={'text': 'Monthly Emissions (kg CO₂)', 'font': {'size': 16}},
-                overlaying='y',
-                side='right',
-                gridcolor='lightgray',
-                range=[0, max(electric_emissions + gas_emissions) * 1.2]  # Dynamic range for emissions
-            ),
-            legend=dict(
-                x=-0.2,              # Shift legend to the left of the chart
-                y=0.5,               # Vertically centered
-                xanchor="right",     # Anchor legend box by its right edge
-                yanchor="middle",
-                orientation='v',     # Vertical legend
-                bgcolor='rgba(255,255,255,0.8)',
-                bordercolor='lightgray',
-                borderwidth=1,
-                font=dict(size=10)
-            ),
-            margin=dict(l=80, r=80, t=120, b=80),
-            plot_bgcolor='white',
-            font=dict(family='Arial, sans-serif')
-        )
+    # Update layout with improved readability
+    fig.update_layout(
+        title={
+            'text': f"Energy Rate Plans for ZIP {zip_code}",
+            'font': {'size': 22, 'family': 'Arial, sans-serif'}
+        },
+        barmode='stack',  # Stack electricity and gas bars
+        bargap=0.4,  # Increased gap between plan groups for clarity
+        bargroupgap=0.1,  # Space between bars in a group
+        yaxis=dict(
+            title={'text': 'Monthly Cost ($)', 'font': {'size': 16}},
+            side='left',
+            gridcolor='lightgray',
+            tickformat='$,.0f'  # Format as currency
+        ),
+        yaxis2=dict(
+            title={'text': 'Monthly Emissions (kg CO₂)', 'font': {'size': 16}},
+            overlaying='y',
+            side='right',
+            gridcolor='lightgray',
+            range=[0, max(electric_emissions + gas_emissions) * 1.2]  # Dynamic range for emissions
+        ),
+        legend=dict(
+            x=-0.2,              # Shift legend to the left of the chart
+            y=0.5,               # Vertically centered
+            xanchor="right",     # Anchor legend box by its right edge
+            yanchor="middle",
+            orientation='v',     # Vertical legend
+            bgcolor='rgba(255,255,255,0.8)',
+            bordercolor='lightgray',
+            borderwidth=1,
+            font=dict(size=10)
+        ),
+        margin=dict(l=80, r=80, t=120, b=80),
+        plot_bgcolor='white',
+        font=dict(family='Arial, sans-serif')
+    )
 
-        # Add hover template for better information display
-        for i in range(len(fig.data)):
-            if i < 2:  # Cost bars
-                fig.data[i].hovertemplate = '%{y:$,.2f}<extra>%{fullData.name}</extra>'
-            else:  # Emissions bar
-                fig.data[i].hovertemplate = '%{y:.1f} kg CO₂<extra>%{fullData.name}</extra>'
+    # Add hover template for better information display
+    for i in range(len(fig.data)):
+        if i < 2:  # Cost bars
+            fig.data[i].hovertemplate = '%{y:$,.2f}<extra>%{fullData.name}</extra>'
+        else:  # Emissions bar
+            fig.data[i].hovertemplate = '%{y:.1f} kg CO₂<extra>%{fullData.name}</extra>'
 
-        # Add x-axis grid lines
-        fig.update_xaxes(
-            tickfont=dict(size=14),
-            showgrid=True,
-            gridcolor='lightgray'
-        )
+    # Add x-axis grid lines
+    fig.update_xaxes(
+        tickfont=dict(size=14),
+        showgrid=True,
+        gridcolor='lightgray'
+    )
 
-        return fig
-    
-    elif active_tab == "tab-electrification":
+    return fig
 
-        fig = go.Figure()
 
-        return fig
+@stage('figure')
+def fan_chart_figure(simulation, title, yaxis_title):
+    """Median and 25-75 / 5-95 percentile bands of a Monte Carlo result over the years."""
+    years, bands = simulation['years'], simulation['bands']
+    fig = go.Figure()
+    for low, high, color in ((5, 95, 'rgba(52, 152, 219, 0.15)'), (25, 75, 'rgba(52, 152, 219, 0.35)')):
+        fig.add_trace(go.Scatter(x=years, y=bands[high], mode='lines', line=dict(width=0),
+                                 showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=years, y=bands[low], mode='lines', line=dict(width=0), fill='tonexty',
+                                 fillcolor=color, name=f"{low}–{high}% of outcomes", hoverinfo='skip'))
+    fig.add_trace(go.Scatter(x=years, y=bands[50], mode='lines+markers', name='Median', line=dict(color="#3498db"),
+                             hovertemplate="Year %{x}: %{y:$,.0f}<extra>Median</extra>"))
+    fig.add_hline(y=0, line=dict(color='gray', dash='dot'))
+    fig.update_layout(
+        title=f"{title} ({simulation['n_trials']:,} simulations)",
+        xaxis_title="Year",
+        yaxis_title=yaxis_title,
+        plot_bgcolor="white",
+        margin=dict(t=50, b=100),
+        legend=dict(x=0.5, y=-0.2, xanchor="center", orientation="h"),
+        yaxis=dict(showgrid=True, gridcolor='lightgray', gridwidth=0.5, zeroline=False),
+    )
+    return fig
 
-@app.callback(
-    Output("plan_comparison_electrification", "figure"),
-    Input("tabs", "active_tab"),
-    Input('zip_input', 'value'),
-    Input('kwh_input', 'value'),
-    Input('therms_input', 'value'),
-    Input('gas_allowance_input', 'value'),
-    Input('cop_input', 'value'),
-    Input('furnace_eff_input', 'value'),
-    Input('heater_eff_input', 'value'),
-    Input('furnace_ratio_slider', 'value'),
-    # Input('furnace_ratio_input', 'value'),
-    # Input('heater_ratio_input', 'value'),
-    Input('electrification_pct_input', 'value'),
-    # Input('solar_size_input', 'value')
-)
-def update_bar_electrification(active_tab, zip_code, kwh_usage, therms_usage, gas_allowance,
-                             cop, furnace_eff, heater_eff, furnace_ratio, electrification_pct):
-    if active_tab != "tab-electrification":
-        raise dash.exceptions.PreventUpdate
 
+# Usage edits return a small Patch that depends on the trigger, so only full figures are cached
+@memoize_callback('update_bar',
+                  skip_if=lambda *args: usage_triggered('kwh_input', 'therms_input', 'gas_allowance_input'))
+def update_bar(zip_code, kwh_usage, therms_usage, gas_allowance, active_tab):
+    """Update the bar chart based on user inputs and selected tab."""
     if not zip_code:
         return go.Figure()
 
     zip_code = zip_code.strip()
+    data = registry.get()
 
-    if zip_code not in zip_to_plans:
+    if zip_code not in data.plan_catalog:
         return go.Figure()
 
-    available_plans = zip_to_plans[zip_code]
-    plans = plan_details_df[plan_details_df['plan'].isin(available_plans)]
+    plans = data.plan_catalog[zip_code]
 
-    gas_emissions_factor = 5.3  # kg CO₂ per therm
-
-    if plans.empty:
+    if len(plans) == 0:
         return go.Figure()
+
+    elif active_tab == "tab-base":
+
+        with stage('compute'):
+            results = evaluate_plans(kwh_usage, therms_usage, gas_allowance,
+                                     plans['price_per_kwh'], plans['emissions_g_per_kwh'],
+                                     data.gas_base_price, data.gas_excess_price)
+
+        # Usage edits keep the plans, so send only the new values
+        if usage_triggered('kwh_input', 'therms_input', 'gas_allowance_input'):
+            return bar_patch([results['elec_cost_orig'], results['gas_cost_orig'],
+                              results['elec_emissions_orig'], results['gas_emissions_orig']])
+
+        return base_bar_figure(zip_code, plans, results)
     
-    if any(v is None for v in [cop, furnace_eff, heater_eff, furnace_ratio, electrification_pct]):
-        raise dash.exceptions.PreventUpdate
-    
-    # --- Convert to decimals ---
-    furnace_ratio /= 100
-    heater_ratio = 1 - furnace_ratio
-    electrification_pct /= 100
-    furnace_eff /= 100
-    heater_eff /= 100
-
-    # --- Calculate additional electricity usage and reduced gas ---
-    additional_kwh = therms_usage * electrification_pct * (
-        furnace_ratio * furnace_eff * 29.3 / cop +
-        heater_ratio * heater_eff * 29.3 / cop
-    )
+    elif active_tab == "tab-electrification":
 
-    reduced_gas = therms_usage * (1 - electrification_pct)
-    adjusted_kwh = kwh_usage + additional_kwh
+        fig = go.Figure()
 
-    fig = go.Figure()
+        return fig
 
-    # --- Load prices ---
-    gas_base_price = gas_plan_details_df[gas_plan_details_df['plan'] == 'PG&E Baseline']['price_per_therm'].values[0]
-    gas_excess_price = gas_plan_details_df[gas_plan_details_df['plan'] == 'PG&E Excess']['price_per_therm'].values[0]
-
-    x_vals = []
-
-    elec_costs = []
-    gas_costs = []
-
-    elec_colors = []
-    gas_colors = []
-    elec_opacities = []
-    gas_opacities = []
-
-    electric_emissions = []
-    gas_emissions = []
-    emission_colors = []
-    emission_opacities = []
-
-    for i, plan in enumerate(plans['plan']):
-        price_per_kwh = plans.loc[plans['plan'] == plan, 'price_per_kwh'].values[0]
-        emissions_factor = plans.loc[plans['plan'] == plan, 'emissions_g_per_kwh'].values[0]
-
-        # Colors
-        elec_color_original = 'lightsteelblue'
-        gas_color_original = '#fdd9a0'
-        elec_color_elec = '#1f77b4'      # Bold blue
-        gas_color_elec = '#ff7f0e'       # Bold orange
-        emission_color_elec = '#d62728'  # Strong red
-        emission_color_gas = '#f2c6a0'   # Soft tan
-
-        # --- Original ---
-        gas_base_orig = gas_base_price * min(therms_usage, gas_allowance * 30)
-        gas_excess_orig = gas_excess_price * max(0, therms_usage - gas_allowance * 30)
-        gas_total_orig = gas_base_orig + gas_excess_orig
-        elec_cost_orig = price_per_kwh * kwh_usage
-        emissions_kg_orig = emissions_factor * kwh_usage / 1000
-        gas_em_orig = gas_emissions_factor * therms_usage
-
-        x_vals.append(plan + " (Original)")
-        elec_costs.append(elec_cost_orig)
-        gas_costs.append(gas_total_orig)
-        elec_colors.append(elec_color_original)
-        gas_colors.append(gas_color_original)
-        elec_opacities.append(0.5)
-        gas_opacities.append(0.5)
-        electric_emissions.append(emissions_kg_orig)
-        gas_emissions.append(gas_em_orig)
-        emission_colors.append(emission_color_elec)
-        emission_opacities.append(0.5)
-
-        # --- Electrified ---
-        gas_base_elec = gas_base_price * min(reduced_gas, gas_allowance * 30)
-        gas_excess_elec = gas_excess_price * max(0, reduced_gas - gas_allowance * 30)
-        gas_total_elec = gas_base_elec + gas_excess_elec
-        elec_cost_elec = price_per_kwh * adjusted_kwh
-        emissions_kg_elec = emissions_factor * adjusted_kwh / 1000
-        gas_em_elec = gas_emissions_factor * reduced_gas
-
-        x_vals.append(plan + " (Electrified)")
-        elec_costs.append(elec_cost_elec)
-        gas_costs.append(gas_total_elec)
-        elec_colors.append(elec_color_elec)
-        gas_colors.append(gas_color_elec)
-        elec_opacities.append(1.0)
-        gas_opacities.append(1.0)
-        electric_emissions.append(emissions_kg_elec)
-        gas_emissions.append(gas_em_elec)
-        emission_colors.append(emission_color_elec)
-        emission_opacities.append(1.0)
+@stage('figure')
+def electrification_bar_figure(zip_code, plans, results):
+    """Original vs electrified cost and emissions bars for every plan."""
+    fig = go.Figure()
 
+    # Colors
+    elec_color_original = 'lightsteelblue'
+    gas_color_original = '#fdd9a0'
+    elec_color_elec = '#1f77b4'      # Bold blue
+    gas_color_elec = '#ff7f0e'       # Bold orange
+    emission_color_elec = '#d62728'  # Strong red
+    emission_color_gas = '#f2c6a0'   # Soft tan
+
+    # Each plan gets an "(Original)" bar followed by an "(Electrified)" bar
+    n_plans = len(plans)
+    x_vals = interleave(np.char.add(plans['plan'], " (Original)"),
+                        np.char.add(plans['plan'], " (Electrified)"))
+
+    elec_costs = interleave(results['elec_cost_orig'], results['elec_cost_elec'])
+    gas_costs = interleave(results['gas_cost_orig'], results['gas_cost_elec'])
+    electric_emissions = interleave(results['elec_emissions_orig'], results['elec_emissions_elec'])
+    gas_emissions = interleave(results['gas_emissions_orig'], results['gas_emissions_elec'])
+
+    elec_colors = [elec_color_original, elec_color_elec] * n_plans
+    gas_colors = [gas_color_original, gas_color_elec] * n_plans
+    elec_opacities = [0.5, 1.0] * n_plans
+    gas_opacities = [0.5, 1.0] * n_plans
+    emission_opacities = [0.5, 1.0] * n_plans
 
     # Electricity Cost Bars
     fig.add_trace(go.Bar(
@@ -810,189 +800,306 @@ def update_bar_electrification(active_tab, zip_code, kwh_usage, therms_usage, ga
 
     return fig
 
+
+@memoize_callback('update_bar_electrification',
+                  skip_if=lambda *args: usage_triggered('kwh_input', 'therms_input', 'gas_allowance_input',
+                                                        'cop_input', 'furnace_eff_input', 'heater_eff_input',
+                                                        'furnace_ratio_slider', 'electrification_pct_input'))
+def update_bar_electrification(active_tab, zip_code, kwh_usage, therms_usage, gas_allowance,
+                             cop, furnace_eff, heater_eff, furnace_ratio, electrification_pct):
+    if active_tab != "tab-electrification":
+        raise dash.exceptions.PreventUpdate
+
+    if not zip_code:
+        return go.Figure()
+
+    zip_code = zip_code.strip()
+    data = registry.get()
+
+    if zip_code not in data.plan_catalog:
+        return go.Figure()
+
+    plans = data.plan_catalog[zip_code]
+
+    if len(plans) == 0:
+        return go.Figure()
+    
+    if any(v is None for v in [cop, furnace_eff, heater_eff, furnace_ratio, electrification_pct]) or cop <= 0:
+        raise dash.exceptions.PreventUpdate
+    
+    # --- Costs and emissions for every plan, original and electrified (percentages -> decimals) ---
+    with stage('compute'):
+        results = evaluate_plans(kwh_usage, therms_usage, gas_allowance,
+                                 plans['price_per_kwh'], plans['emissions_g_per_kwh'],
+                                 data.gas_base_price, data.gas_excess_price,
+                                 cop=cop,
+                                 furnace_eff=furnace_eff / 100,
+                                 heater_eff=heater_eff / 100,
+                                 furnace_ratio=furnace_ratio / 100,
+                                 electrification_pct=electrification_pct / 100)
+
+    if usage_triggered('kwh_input', 'therms_input', 'gas_allowance_input', 'cop_input', 'furnace_eff_input',
+                       'heater_eff_input', 'furnace_ratio_slider', 'electrification_pct_input'):
+        return bar_patch([interleave(results['elec_cost_orig'], results['elec_cost_elec']),
+                          interleave(results['gas_cost_orig'], results['gas_cost_elec']),
+                          interleave(results['elec_emissions_orig'], results['elec_emissions_elec']),
+                          interleave(results['gas_emissions_orig'], results['gas_emissions_elec'])])
+
+    return electrification_bar_figure(zip_code, plans, results)
+
+
+def update_plan_vectors(zip_code):
+    """Plan vectors and zeroed chart templates for the browser-side bar charts."""
+    if not zip_code:
+        return None
+
+    zip_code = zip_code.strip()
+    data = registry.get()
+    plans = data.plan_catalog.get(zip_code)
+
+    if plans is None or len(plans) == 0:
+        return None
+
+    # Every bar at zero; assets/bar_charts.js fills in the values
+    zeros = evaluate_plans(0, 0, 0, plans['price_per_kwh'], plans['emissions_g_per_kwh'],
+                           data.gas_base_price, data.gas_excess_price)
+
+    return {
+        'price_per_kwh': plans['price_per_kwh'].tolist(),
+        'emissions_g_per_kwh': plans['emissions_g_per_kwh'].tolist(),
+        'gas_base_price': data.gas_base_price,
+        'gas_excess_price': data.gas_excess_price,
+        'gas_emissions_kg_per_therm': GAS_EMISSIONS_KG_PER_THERM,
+        'kwh_per_therm': KWH_PER_THERM,
+        'days_per_month': DAYS_PER_MONTH,
+        'base_figure': base_bar_figure(zip_code, plans, zeros),
+        'electrification_figure': electrification_bar_figure(zip_code, plans, zeros),
+    }
+
+
+USAGE_INPUTS = [
+    Input('kwh_input', 'value'),
+    Input('therms_input', 'value'),
+    Input('gas_allowance_input', 'value'),
+]
+ELECTRIFICATION_INPUTS = [
+    Input('cop_input', 'value'),
+    Input('furnace_eff_input', 'value'),
+    Input('heater_eff_input', 'value'),
+    Input('furnace_ratio_slider', 'value'),
+    Input('electrification_pct_input', 'value'),
+]
+
+# The bar charts are simple arithmetic over the ZIP's plans. So by default the
+# plan vectors go to the browser once per ZIP, and usage edits are
+# recomputed there (assets/bar_charts.js) with no server round trip.
+# CLIENTSIDE_FIGURES=0 renders the charts on the server instead.
+if CLIENTSIDE_FIGURES:
+    app.callback(
+        Output('plan-vectors-store', 'data'),
+        Input('zip_input', 'value')
+    )(update_plan_vectors)
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='bar_charts', function_name='base'),
+        Output('plan_comparison', 'figure'),
+        Input('plan-vectors-store', 'data'),
+        *USAGE_INPUTS,
+        Input("tabs", "active_tab")
+    )
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='bar_charts', function_name='electrification'),
+        Output("plan_comparison_electrification", "figure"),
+        Input("tabs", "active_tab"),
+        Input('plan-vectors-store', 'data'),
+        *USAGE_INPUTS,
+        *ELECTRIFICATION_INPUTS
+    )
+else:
+    app.callback(
+        Output('plan_comparison', 'figure'),
+        Input('zip_input', 'value'),
+        *USAGE_INPUTS,
+        Input("tabs", "active_tab")
+    )(update_bar)
+
+    app.callback(
+        Output("plan_comparison_electrification", "figure"),
+        Input("tabs", "active_tab"),
+        Input('zip_input', 'value'),
+        *USAGE_INPUTS,
+        *ELECTRIFICATION_INPUTS
+    )(update_bar_electrification)
+
+
 # Callback: Update pie chart based on selected plan
 @app.callback(
     Output('power_mix_pie', 'figure'),
     Input('plan_selector', 'value')
 )
 def update_pie_chart(selected_plan):
-    if not selected_plan:
+    pie_figures = registry.get().pie_figures
+
+    if not selected_plan or selected_plan not in pie_figures:
         return go.Figure()
 
-    # Ordered sources with cleaner labels
-    power_sources = [
-        "Coal", "Large Hydroelectric", "Natural Gas", "Nuclear", "Non-Renewable Other", "Unspecified",
-        "Biomass & Biowaste", "Geothermal", "Eligible Hydroelectric", "Solar", "Wind", "Renewable Other"
-    ]
-    
-    # Original column names in dataframe
-    df_columns = [
-        "Coal", "Large Hydroelectric", "Natural Gas", "Nuclear", "Non-Renewable_Others", "Unspecified Power",
-        "Biomass & Biowaste", "Geothermal", "Eligible Hydrelectric", "Solar", "Wind", "Renewable_Others"
-    ]
-
-    # Color scheme: red-orange tones for non-renewables, green-blue for renewables
-    colors = [
-        # Non-Renewables (darker tones)
-        "#4d0f00",  # Coal – dark reddish-brown
-        "#6b200c",  # Large Hydro (controversial) – dark clay
-        "#8b2c02",  # Natural Gas – rich dark orange
-        "#a63603",  # Nuclear – burnt orange
-        "#b15928",  # Non-Renewable Others – earthy brown
-        "#666666",  # Unspecified – dark neutral gray
-
-        # Renewables (clean, vibrant)
-        "#006d2c",  # Biomass – forest green
-        "#31a354",  # Geothermal – bright leaf green
-        "#74c476",  # Hydroelectric – mint green
-        "#fed976",  # Solar – soft yellow
-        "#6baed6",  # Wind – light sky blue
-        "#2171b5"   # Renewable Others – deeper blue
-    ]
-
-    row = plan_details_df[plan_details_df['plan'] == selected_plan].iloc[0]
-    values = row[df_columns].astype(float).values
-    
-    # Group small slices into "Other" category for cleaner visualization
-    threshold = 0.03  # 3% threshold
-    combined_labels = []
-    combined_values = []
-    combined_colors = []
-    is_renewable = []  # Track which slices are renewable
-    
-    non_renewable_small = 0
-    renewable_small = 0
-    
-    for i, (source, value, color) in enumerate(zip(power_sources, values, colors)):
-        if value < threshold:
-            if i < 6:  # Non-renewable sources
-                non_renewable_small += value
-            else:  # Renewable sources
-                renewable_small += value
-        else:
-            combined_labels.append(source)
-            combined_values.append(value)
-            combined_colors.append(color)
-            is_renewable.append(i >= 6)  # True if index >= 6 (renewable)
-    
-    # Add combined categories if they exist
-    if non_renewable_small > 0:
-        combined_labels.append("Other Non-Renewable")
-        combined_values.append(non_renewable_small)
-        combined_colors.append("#969696")  # Gray
-        is_renewable.append(False)
-        
-    if renewable_small > 0:
-        combined_labels.append("Other Renewable")
-        combined_values.append(renewable_small)
-        combined_colors.append("#b3de69")  # Light green
-        is_renewable.append(True)
-    
-    # Calculate renewable vs non-renewable percentage
-    renewable_pct = sum(values[6:])
-    non_renewable_pct = sum(values[:6])
-    total = renewable_pct + non_renewable_pct
-    
-    if total > 0:
-        renewable_pct = round((renewable_pct / total) * 100)
-        non_renewable_pct = round((non_renewable_pct / total) * 100)
-    
-    # Create pull array - pull out all renewable sources
-    # pull = [0.1 if is_renewable[i] else 0 for i in range(len(combined_labels))]
-    
-    pie_fig = go.Figure(data=[
-        go.Pie(
-            labels=combined_labels,
-            values=combined_values,
-            hole=0.4,
-            marker=dict(colors=combined_colors),
-            name=selected_plan,
-            sort=False,
-            direction='clockwise',
-            rotation=0,  # Start at top
-            textinfo='percent',  # Show only percentages on the chart
-            textposition='inside',
-            #pull=pull,  # Pull out renewable sources
-            textfont=dict(size=14, color='white'),
-            insidetextorientation='radial',
-            domain=dict(x=[0, 0.7])  # Fix chart width to 70% of figure
-        )
+    return pie_figures[selected_plan]
+
+
+# Solar tab defaults, used by the recommender until the user configures a system there
+DEFAULT_ROOF_SQFT = 400
+DEFAULT_SOLAR_SETTINGS = (20, 180, 1, 1, 14)  # tilt, azimuth, array type, module type, losses
+
+
+@functools.lru_cache(maxsize=1024)
+def local_solar_kwh_per_kw(zip_code):
+    """Average monthly kWh per kW at the ZIP with the Solar tab's default array, 0 if it can't be located.
+
+    Uses the bundled centroids and the local solar model whatever
+    SOLAR_BACKEND is, so it never waits on Nominatim or PVWatts.
+    """
+    with stage('geocode'):
+        lat, lon = zip_to_latlon(zip_code, fallback=False)
+    if lat is None:
+        return 0.0
+    tilt, azimuth, array_type, module_type, losses = DEFAULT_SOLAR_SETTINGS
+    with stage('solar'):
+        data = fetch_solar_potential(lat, lon, 1.0, azimuth, tilt, array_type, module_type, losses, backend='local')
+    return data['outputs']['ac_annual'] / 12
+
+
+def option_card(title, option, color):
+    """Summary card for one recommended combination."""
+    return dbc.Card(dbc.CardBody([
+        html.H6(title, className="fw-bold", style={'color': color}),
+        html.P(option['plan'], className="mb-1 fw-bold"),
+        html.Ul([
+            html.Li(f"Electrify furnace: {option['furnace_pct']:.0f}%"),
+            html.Li(f"Electrify water heater: {option['heater_pct']:.0f}%"),
+            html.Li(f"Solar: {option['solar_kw']:.2f} kW"),
+            html.Li(f"Monthly cost: ${option['cost']:,.2f}"),
+            html.Li(f"Monthly emissions: {option['emissions']:,.1f} kg CO₂"),
+        ], style={'fontSize': '13px', 'paddingLeft': '18px', 'marginBottom': 0}),
+    ]), className="h-100 shadow-sm")
+
+
+@app.callback(
+    Output('recommendation-panel', 'children'),
+    Input('zip_input', 'value'),
+    *USAGE_INPUTS,
+    *ELECTRIFICATION_INPUTS,
+    Input('solar-yield-store', 'data'),
+    State('solar-location-store', 'data')
+)
+def update_recommendations(zip_code, kwh_usage, therms_usage, gas_allowance, cop, furnace_eff, heater_eff,
+                           furnace_ratio, electrification_pct, solar, solar_location_data):
+    # electrification_pct is searched over, so the entered value isn't used
+    inputs = [kwh_usage, therms_usage, gas_allowance, cop, furnace_eff, heater_eff, furnace_ratio]
+    if not zip_code or any(v is None for v in inputs) or cop <= 0:
+        return None
+
+    zip_code = zip_code.strip()
+    data = registry.get()
+    plans = data.plan_catalog.get(zip_code)
+    if plans is None or len(plans) == 0:
+        return None
+
+    # Solar output per kW and the largest system the roof takes: the Solar tab's
+    # system if it was set up for this ZIP, else the tab's defaults with the local model
+    if solar and solar.get('system') and solar_location_data and solar_location_data.get('zip') == zip_code:
+        max_solar_kw = solar['system'][2]
+        solar_kwh_per_kw = solar['annual_kwh'] / 12 / max_solar_kw
+    else:
+        solar_kwh_per_kw = local_solar_kwh_per_kw(zip_code)
+        max_solar_kw = DEFAULT_ROOF_SQFT / 100 if solar_kwh_per_kw else 0.0
+
+    result = recommend(
+        plans['plan'], kwh=kwh_usage, therms=therms_usage, gas_allowance=gas_allowance,
+        price_per_kwh=plans['price_per_kwh'], emissions_g_per_kwh=plans['emissions_g_per_kwh'],
+        gas_base_price=data.gas_base_price, gas_excess_price=data.gas_excess_price,
+        solar_kwh_per_kw=solar_kwh_per_kw, max_solar_kw=max_solar_kw,
+        cop=cop, furnace_eff=furnace_eff / 100, heater_eff=heater_eff / 100, furnace_ratio=furnace_ratio / 100,
+    )
+
+    frontier = result['frontier']
+    frontier_fig = go.Figure(go.Scatter(
+        x=frontier['cost'], y=frontier['emissions'], mode='lines+markers', line=dict(color="#3498db"),
+        customdata=np.column_stack((frontier['plan'], frontier['furnace_pct'], frontier['heater_pct'], frontier['solar_kw'])),
+        hovertemplate=("%{customdata[0]}<br>Furnace %{customdata[1]}%, water heater %{customdata[2]}%, "
+                       "solar %{customdata[3]} kW<br>$%{x:,.2f}/month, %{y:.1f} kg CO₂/month<extra></extra>"),
+        name="Best trade-offs"
+    ))
+    for key, color in (('cheapest', "#27ae60"), ('greenest', "#16a085"), ('balanced', "#8e44ad")):
+        frontier_fig.add_trace(go.Scatter(
+            x=[result[key]['cost']], y=[result[key]['emissions']], mode='markers',
+            marker=dict(size=12, color=color), name=key.capitalize(), hoverinfo='skip'
+        ))
+    frontier_fig.update_layout(
+        title=f"Cost vs. Emissions Trade-offs ({result['n_combinations']:,} combinations)",
+        xaxis_title="Monthly Cost ($)",
+        yaxis_title="Monthly Emissions (kg CO₂)",
+        plot_bgcolor="white",
+        margin=dict(t=50, b=50),
+        xaxis=dict(showgrid=True, gridcolor='lightgray'),
+        yaxis=dict(showgrid=True, gridcolor='lightgray'),
+    )
+
+    return html.Div([
+        html.H5("Best Options"),
+        html.P("Every plan, furnace and water heater electrification level (0–100%) and solar size up to "
+               f"{max_solar_kw:.2f} kW; solar cost is spread over {HORIZON_YEARS} years.",
+               style={'fontSize': '13px'}),
+        dbc.Row([
+            dbc.Col(option_card("Cheapest", result['cheapest'], "#27ae60"), width=4),
+            dbc.Col(option_card("Lowest Emissions", result['greenest'], "#16a085"), width=4),
+            dbc.Col(option_card("Balanced", result['balanced'], "#8e44ad"), width=4),
+        ], className="mb-3"),
+        dcc.Graph(figure=frontier_fig, style={'height': '400px'}),
     ])
 
-    pie_fig.update_layout(
-        title={
-            'text': f"Power Mix for {selected_plan}<br><span style='font-size:18px;color:#2ca25f'>{renewable_pct}% Renewable</span> | <span style='font-size:18px;color:#d73027'>{non_renewable_pct}% Non-Renewable</span>",
-            'x': 0.5,
-            'xanchor': 'center',
-            'font': dict(size=22),
-            'y': 0.95
-        },
-        margin=dict(l=20, r=20, t=20, b=20),  # Increased bottom margin for legend
-        height=500,  # Increased height to accommodate bottom legend
-        legend=dict(
-            orientation='v',
-            x=0.85,       # Start legend at 75% of the width
-            y=0.5,
-            xanchor='left',
-            yanchor='middle',
-            font=dict(size=12),
-            bordercolor='lightgrey',
-            borderwidth=1,
-            bgcolor='rgba(255, 255, 255, 0.9)',
-            traceorder='normal'
-        ),
-        showlegend=True,
-        paper_bgcolor='white'
+
+@functools.lru_cache(maxsize=256)
+def electrification_uncertainty(kwh, therms, gas_allowance, price_per_kwh, gas_base_price, gas_excess_price,
+                                cop, furnace_eff, heater_eff, furnace_ratio, electrification_pct):
+    return electrification_monte_carlo(
+        kwh=kwh, therms=therms, gas_allowance=gas_allowance, price_per_kwh=price_per_kwh,
+        gas_base_price=gas_base_price, gas_excess_price=gas_excess_price, cop=cop,
+        furnace_eff=furnace_eff / 100, heater_eff=heater_eff / 100, furnace_ratio=furnace_ratio / 100,
+        electrification_pct=electrification_pct / 100,
     )
 
-    return pie_fig
+
+@app.callback(
+    Output('electrification_fan_chart', 'figure'),
+    Input('zip_input', 'value'),
+    Input('plan_selector', 'value'),
+    *USAGE_INPUTS,
+    *ELECTRIFICATION_INPUTS
+)
+def update_electrification_fan_chart(zip_code, selected_plan, kwh_usage, therms_usage, gas_allowance,
+                                     cop, furnace_eff, heater_eff, furnace_ratio, electrification_pct):
+    inputs = [kwh_usage, therms_usage, gas_allowance, cop, furnace_eff, heater_eff, furnace_ratio, electrification_pct]
+    if not zip_code or not selected_plan or any(v is None for v in inputs) or cop <= 0:
+        return go.Figure()
+
+    data = registry.get()
+    plans = data.plan_catalog.get(zip_code.strip())
+    if plans is None:
+        return go.Figure()
+    row = plans[plans['plan'] == selected_plan]
+    if len(row) == 0:
+        return go.Figure()
+
+    simulation = electrification_uncertainty(kwh_usage, therms_usage, gas_allowance, float(row['price_per_kwh'][0]),
+                                             data.gas_base_price, data.gas_excess_price, *inputs[3:])
+    return fan_chart_figure(simulation, f"Cumulative Electrification Savings – {selected_plan}",
+                            "Cumulative Savings ($)")
 
 ##########################
 ## Solar Simulation Tab ##
 ##########################
 
-from geopy.geocoders import Nominatim
-
-def zip_to_latlon(zip_code):
-    geolocator = Nominatim(user_agent="solar_app")
-    try:
-        location = geolocator.geocode({"postalcode": zip_code}, timeout=5)
-        if location:
-            return location.latitude, location.longitude
-        else:
-            return None, None
-    except Exception as e:
-        print(f"Geocoding error: {e}")
-        return None, None
-
-
-def fetch_solar_potential(lat, lon, system_capacity_kw=4.0, azimuth=180, tilt=20,
-                          array_type=1, module_type=1, losses=14):
-    """Fetches estimated solar output from NREL PVWatts API with custom params."""
-    url = "https://developer.nrel.gov/api/pvwatts/v6.json"
-    params = {
-        "api_key": "897BGzhguuFnqgrEN2wTzPijQrA2n9xUpwytM6H8",  # Use your own API key
-        "lat": lat,
-        "lon": lon,
-        "system_capacity": system_capacity_kw,
-        "azimuth": azimuth,
-        "tilt": tilt,
-        "array_type": array_type,
-        "module_type": module_type,
-        "losses": losses,
-        "dataset": "nsrdb",
-        "timeframe": "monthly"
-    }
-
-    response = requests.get(url, params=params)
-    print("Request URL:", response.url)
-    print("Status Code:", response.status_code)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Error: {response.status_code}")
-        return None
-    
 @app.callback(
     [Output('plan_selector_solar', 'options'),
      Output('plan_selector_solar', 'value')],
@@ -1003,17 +1110,14 @@ def update_dropdown(zip_code):
         return [], None
 
     zip_code = zip_code.strip()
+    data = registry.get()
 
-    if zip_code not in zip_to_plans:
+    if zip_code not in data.plan_catalog:
         return [], None
 
-    available_plans = zip_to_plans[zip_code]
-    plans = plan_details_df[plan_details_df['plan'].isin(available_plans)]
-
-    options = [{'label': plan, 'value': plan} for plan in plans['plan']]
-    default_value = plans['plan'].iloc[0]
+    plans = data.plan_catalog[zip_code]
 
-    return options, default_value
+    return plan_options(plans)
     
 # Add a callback for the collapsible advanced settings section
 @app.callback(
@@ -1026,147 +1130,349 @@ def toggle_electrification_collapse(n, is_open):
         return not is_open
     return is_open
 
-@app.callback(
-    Output("solar-simulation-content", "children"),
-    Output("solar-simulation-content-2", "children"),
-    Input("tabs", "active_tab"),
-    Input("zip_input", "value"),
-    Input("kwh_input", "value"),
-    Input("solar_coverage_input", "value"),
-    Input("roof_sqft_input", "value"),
-    Input("tilt_input", "value"),
-    Input("azimuth_input", "value"),
-    Input("array_type_input", "value"),
-    Input("module_type_input", "value"),
-    Input("losses_input", "value"), 
-    Input("plan_selector_solar", "value")
-)
-def update_solar_tab(active_tab, zip_code, monthly_kwh_usage, solar_coverage_ratio_pct,
-                     roof_sqft, tilt, azimuth, array_type, module_type, losses, selected_plan):
-    if active_tab != "tab-solar" or not zip_code:
-        raise dash.exceptions.PreventUpdate
-    
-    zip_code = str(zip_code).strip()
-    lat, lon = zip_to_latlon(zip_code)
-    if lat is None:
-        return html.P("Could not geocode ZIP code."), go.Figure()
+# The Solar tab is a pipeline of stages, each memoized on its own inputs and
+# passing its result to the next through a dcc.Store:
+#   location (ZIP) -> yield (array settings) -> offset (usage, coverage)
+#   -> per-plan savings / 20-year projection (plan)
+# so changing e.g. the plan only re-runs the projection.
 
+def solar_location(zip_code):
+    # Not memoized here: geocode caches resolved ZIPs itself, and a failed
+    # Nominatim lookup has to be retried on the next request
+    with stage('geocode'):
+        lat, lon = zip_to_latlon(zip_code)
+    return {'zip': zip_code, 'lat': lat, 'lon': lon}
+
+
+@functools.lru_cache(maxsize=1024)
+def solar_yield(lat, lon, roof_sqft, tilt, azimuth, array_type, module_type, losses):
     # Estimate system size (1 kW ~ 100 sqft)
     system_capacity_kw = roof_sqft / 100.0 if roof_sqft else 4.0
 
     # Fetch solar output estimate
-    data = fetch_solar_potential(lat, lon, system_capacity_kw, azimuth, tilt, array_type, module_type, losses)
+    with stage('solar'):
+        data = fetch_solar_potential(lat, lon, system_capacity_kw, azimuth, tilt, array_type, module_type, losses)
     if not data or "outputs" not in data:
-        return html.P("Failed to retrieve solar data."), go.Figure()
+        return None
+
+    return {
+        'monthly_kwh': list(data["outputs"]["ac_monthly"]),
+        'annual_kwh': data["outputs"]["ac_annual"],
+        # Array settings, for the hourly production used by net metering
+        'system': [lat, lon, system_capacity_kw, azimuth, tilt, array_type, module_type, losses],
+    }
 
-    monthly_kwh = data["outputs"]["ac_monthly"]
-    annual_kwh = data["outputs"]["ac_annual"]
 
+@functools.lru_cache(maxsize=1024)
+def solar_offset(avg_monthly_output, monthly_kwh_usage, solar_coverage_ratio_pct):
     # Convert % to ratio
     coverage_ratio = (solar_coverage_ratio_pct or 70) / 100.0
 
-    # Compute achievable average monthly output
-    avg_monthly_output = sum(monthly_kwh) / 12
-
     # Requested offset in kWh
     requested_offset = (monthly_kwh_usage or 0) * coverage_ratio
 
     # Final offset is the lesser of the two
     monthly_solar_offset = min(requested_offset, avg_monthly_output)
 
-    # Generate warning message if user request exceeds capacity
-    warning_msg = None
     if requested_offset > avg_monthly_output:
         actual_coverage = (avg_monthly_output / (monthly_kwh_usage or 1)) * 100
-        warning_msg = html.Div([
-            html.P(f"⚠️ Your roof space can only support about {int(actual_coverage)}% of your monthly usage.",
-                style={'color': 'orange', 'fontWeight': 'bold'})
-        ])
     else:
         actual_coverage = coverage_ratio * 100
 
+    return {
+        'monthly_kwh_usage': monthly_kwh_usage,
+        'coverage_ratio': coverage_ratio,
+        'monthly_solar_offset': monthly_solar_offset,
+        'actual_coverage': actual_coverage,
+        # User request exceeds what the roof can produce
+        'capped': requested_offset > avg_monthly_output,
+    }
+
+
+@functools.lru_cache(maxsize=1024)
+def solar_projection(monthly_kwh_usage, price_per_kwh, actual_coverage):
+    annual_cost = monthly_kwh_usage * price_per_kwh * 12
+    years, accum_cost_with, accum_cost_without = cumulative_costs(annual_cost, actual_coverage / 100)
+
+    # Total savings over 20 years
+    total_savings = float(accum_cost_without[-1] - accum_cost_with[-1])
+
+    # Estimate payback year
+    payback = payback_year(accum_cost_with, accum_cost_without)
+    payback = None if np.isnan(payback) else int(payback)
+
+    return years, accum_cost_with, accum_cost_without, total_savings, payback
+
+
+# Axes of the payback sensitivity heatmap
+SENSITIVITY_INFLATION = np.linspace(1.0, 1.06, 50)      # 0-6% annual rate increase
+SENSITIVITY_UP_FRONT_COST = np.linspace(5000, 20000, 50)
+
+
+@functools.lru_cache(maxsize=256)
+def solar_sensitivity(monthly_kwh_usage, price_per_kwh, actual_coverage):
+    """Payback year over electricity rate increase x up-front cost."""
+    annual_cost = monthly_kwh_usage * price_per_kwh * 12
+    return sensitivity_grid(annual_cost, actual_coverage / 100,
+                            'inflation', SENSITIVITY_INFLATION,
+                            'up_front_cost', SENSITIVITY_UP_FRONT_COST)
+
+
+@functools.lru_cache(maxsize=256)
+def solar_uncertainty(monthly_kwh_usage, price_per_kwh, actual_coverage):
+    """Monte Carlo spread of net savings and payback year around the fixed-assumption projection."""
+    annual_cost = monthly_kwh_usage * price_per_kwh * 12
+    return solar_monte_carlo(annual_cost, actual_coverage / 100)
+
+
+@app.callback(
+    Output("solar-location-store", "data"),
+    Input("tabs", "active_tab"),
+    Input("zip_input", "value")
+)
+def update_solar_location(active_tab, zip_code):
+    if active_tab != "tab-solar" or not zip_code:
+        raise dash.exceptions.PreventUpdate
+
+    return solar_location(str(zip_code).strip())
+
+
+@app.callback(
+    Output("solar-yield-store", "data"),
+    Input("solar-location-store", "data"),
+    Input("roof_sqft_input", "value"),
+    Input("tilt_input", "value"),
+    Input("azimuth_input", "value"),
+    Input("array_type_input", "value"),
+    Input("module_type_input", "value"),
+    Input("losses_input", "value")
+)
+def update_solar_yield(location, roof_sqft, tilt, azimuth, array_type, module_type, losses):
+    if not location or location['lat'] is None:
+        return None
+    # A cleared input; the Solar tab then shows "Failed to retrieve solar data."
+    if any(v is None for v in (tilt, azimuth, array_type, module_type, losses)):
+        return None
+
+    return solar_yield(location['lat'], location['lon'], roof_sqft, tilt, azimuth, array_type, module_type, losses)
+
+
+@app.callback(
+    Output("solar-offset-store", "data"),
+    Input("solar-yield-store", "data"),
+    Input("kwh_input", "value"),
+    Input("solar_coverage_input", "value")
+)
+def update_solar_offset(solar, monthly_kwh_usage, solar_coverage_ratio_pct):
+    if not solar:
+        return None
+
+    # Compute achievable average monthly output
+    avg_monthly_output = sum(solar['monthly_kwh']) / 12
+
+    return solar_offset(avg_monthly_output, monthly_kwh_usage, solar_coverage_ratio_pct)
+
+
+@app.callback(
+    Output("solar-simulation-content", "children"),
+    Input("solar-location-store", "data"),
+    Input("solar-yield-store", "data"),
+    Input("solar-offset-store", "data")
+)
+@memoize_callback('update_solar_tab')
+def update_solar_tab(location, solar, offset):
+    if not location:
+        raise dash.exceptions.PreventUpdate
+
+    zip_code = location['zip']
+    if location['lat'] is None:
+        return html.P("Could not geocode ZIP code.")
+
+    if not solar or not offset:
+        return html.P("Failed to retrieve solar data.")
+
+    monthly_kwh = solar['monthly_kwh']
+    annual_kwh = solar['annual_kwh']
+    coverage_ratio = offset['coverage_ratio']
+    monthly_solar_offset = offset['monthly_solar_offset']
+
+    # Generate warning message if user request exceeds capacity
+    warning_msg = None
+    if offset['capped']:
+        warning_msg = html.Div([
+            html.P(f"⚠️ Your roof space can only support about {int(offset['actual_coverage'])}% of your monthly usage.",
+                style={'color': 'orange', 'fontWeight': 'bold'})
+        ])
 
     # --- Get available plans at ZIP ---
-    if zip_code not in zip_to_plans:
-        return html.P("No electricity plans available for this ZIP code."), go.Figure()
+    data = registry.get()
+    if zip_code not in data.plan_catalog:
+        return html.P("No electricity plans available for this ZIP code.")
 
-    available_plans = zip_to_plans[zip_code]
-    plans = plan_details_df[plan_details_df['plan'].isin(available_plans)]
+    plans = data.plan_catalog[zip_code]
 
     # --- Cost & Emissions Savings per Plan ---
-    cost_savings = []
-    emissions_savings = []
-    plan_labels = []
-
-    for _, row in plans.iterrows():
-        price_per_kwh = row['price_per_kwh']
-        emissions_factor = row['emissions_g_per_kwh']  # g CO₂ per kWh
-
-        monthly_cost_saving = monthly_solar_offset * price_per_kwh
-        monthly_emissions_saving = (monthly_solar_offset * emissions_factor) / 1000  # kg CO₂
-
-        plan_labels.append(row['plan'])
-        cost_savings.append(monthly_cost_saving)
-        emissions_savings.append(monthly_emissions_saving)
-
-    # --- Graph for cost & emissions savings ---
-    savings_fig = go.Figure()
-    savings_fig.add_trace(go.Bar(x=plan_labels, y=cost_savings, name="Monthly Cost Savings ($)", marker_color="#3498db", yaxis="y", offsetgroup=0))
-    savings_fig.add_trace(go.Bar(x=plan_labels, y=emissions_savings, name="Monthly Emissions Savings (kg CO₂)", marker_color="#e74c3c", yaxis="y2", offsetgroup=1))
-    savings_fig.update_layout(
-        title="Estimated Monthly Solar Savings by Plan",
-        barmode="group",
-        yaxis=dict(title="Cost Savings ($)", side="left"),
-        yaxis2=dict(title="Emissions Savings (kg CO₂)", overlaying="y", side="right"),
-        legend=dict(x=0.5, y=-0.3, xanchor="center", orientation="h"),
-        margin=dict(t=50, b=100),
-        plot_bgcolor="white"
-    )
+    plan_labels = plans['plan']
+    cost_savings = monthly_solar_offset * plans['price_per_kwh']
+    emissions_savings = (monthly_solar_offset * plans['emissions_g_per_kwh']) / 1000  # kg CO₂
+
+    with stage('figure'):
+        # --- Graph for cost & emissions savings ---
+        savings_fig = go.Figure()
+        savings_fig.add_trace(go.Bar(x=plan_labels, y=cost_savings, name="Monthly Cost Savings ($)", marker_color="#3498db", yaxis="y", offsetgroup=0))
+        savings_fig.add_trace(go.Bar(x=plan_labels, y=emissions_savings, name="Monthly Emissions Savings (kg CO₂)", marker_color="#e74c3c", yaxis="y2", offsetgroup=1))
+        savings_fig.update_layout(
+            title="Estimated Monthly Solar Savings by Plan",
+            barmode="group",
+            yaxis=dict(title="Cost Savings ($)", side="left"),
+            yaxis2=dict(title="Emissions Savings (kg CO₂)", overlaying="y", side="right"),
+            legend=dict(x=0.5, y=-0.3, xanchor="center", orientation="h"),
+            margin=dict(t=50, b=100),
+            plot_bgcolor="white"
+        )
 
-    # --- Graph for monthly solar output ---
-    bar_fig = go.Figure(data=[
-        go.Bar(x=list(calendar.month_abbr[1:]), y=monthly_kwh, marker_color="#7cc4b0")
+        # --- Graph for monthly solar output ---
+        bar_fig = go.Figure(data=[
+            go.Bar(x=list(calendar.month_abbr[1:]), y=monthly_kwh, marker_color="#7cc4b0")
+        ])
+        bar_fig.update_layout(
+            title=f"Estimated Monthly Solar Output for ZIP {zip_code}",
+            yaxis_title="kWh",
+            plot_bgcolor="white"
+        )
+
+    return html.Div([
+        warning_msg if warning_msg else None,
+        
+        dbc.Row([
+            # Left: Cost & Emissions Savings Chart with heading
+            dbc.Col(html.Div([
+                html.H5(f"Estimated Monthly Solar Savings (Assuming {int(coverage_ratio * 100)}% Offset)"),
+                dcc.Graph(figure=savings_fig)
+            ]), width=6),
+
+            # Right: Monthly Output Chart with heading
+            dbc.Col(html.Div([
+                html.H5(f"Estimated Annual Output: {int(annual_kwh)} kWh"),
+                dcc.Graph(figure=bar_fig)
+            ]), width=6),
+        ], className="mb-4"),
+        html.Hr(),
     ])
-    bar_fig.update_layout(
-        title=f"Estimated Monthly Solar Output for ZIP {zip_code}",
+
+
+def solar_net_metering(zip_code, system, monthly_kwh_usage, monthly_solar_offset, policy_name):
+    """Hour-by-hour self-consumption, exports and annual bills for the ZIP's plans under a net metering policy."""
+    data = registry.get()
+    plans = data.plan_catalog.get(zip_code)
+    policy = data.net_metering.get(policy_name)
+    with stage('solar'):
+        production = fetch_hourly_production(*system)
+    if plans is None or policy is None or production is None or not production.any():
+        return None
+
+    # Size the system to the requested coverage, as the monthly offset does
+    production = production * (monthly_solar_offset * 12 / production.sum())
+    with stage('compute'):
+        bills = net_metering_bills(hourly_profile(monthly_kwh_usage or 0), production, data.tariffs, policy)
+
+    # Tariffs follow plan_details.csv order, as do the ZIP's plans
+    in_zip = np.isin(data.tariffs.names, plans['plan'])
+    return {
+        'policy': policy,
+        'plans': data.tariffs.names[in_zip],
+        'self_consumed': bills['self_consumed'],
+        'exported': bills['exported'],
+        'imported': bills['imported'],
+        'export_credits': bills['export_credits'].sum(axis=-1)[in_zip],
+        'annual': bills['annual'][in_zip],
+        'annual_without_solar': bills['annual_without_solar'][in_zip],
+    }
+
+
+@app.callback(
+    Output("solar-net-metering-content", "children"),
+    Input("solar-location-store", "data"),
+    Input("solar-yield-store", "data"),
+    Input("solar-offset-store", "data"),
+    Input("net_metering_input", "value")
+)
+def update_solar_net_metering(location, solar, offset, policy_name):
+    if not location or not solar or not offset or not policy_name:
+        return None
+
+    result = solar_net_metering(location['zip'], tuple(solar['system']), offset['monthly_kwh_usage'],
+                                offset['monthly_solar_offset'], policy_name)
+    if result is None:
+        return None
+
+    months = list(calendar.month_abbr[1:])
+    flows_fig = go.Figure([
+        go.Bar(x=months, y=result['self_consumed'], name="Self-Consumed", marker_color="#7cc4b0"),
+        go.Bar(x=months, y=result['exported'], name="Exported", marker_color="#f1c40f"),
+        go.Bar(x=months, y=result['imported'], name="Imported", marker_color="#95a5a6"),
+    ])
+    flows_fig.update_layout(
+        title="Monthly Energy Flows",
+        barmode="stack",
         yaxis_title="kWh",
+        legend=dict(x=0.5, y=-0.2, xanchor="center", orientation="h"),
         plot_bgcolor="white"
     )
 
-    ######## 20 year projection ########
-    row = plan_details_df[plan_details_df['plan'] == selected_plan]
+    bills_fig = go.Figure([
+        go.Bar(x=result['plans'], y=result['annual_without_solar'], name="Without Solar", marker_color="#e74c3c"),
+        go.Bar(x=result['plans'], y=result['annual'], name=f"With Solar ({policy_name})", marker_color="#3498db"),
+    ])
+    bills_fig.update_layout(
+        title="Annual Electricity Bill by Plan",
+        barmode="group",
+        yaxis_title="Annual Bill ($)",
+        legend=dict(x=0.5, y=-0.3, xanchor="center", orientation="h"),
+        margin=dict(t=50, b=100),
+        plot_bgcolor="white"
+    )
 
-    years = list(range(1, 21))
-    up_front_cost = 10626
-    accum_cost_with = []
-    accum_cost_without = []
-    price_per_kwh = row['price_per_kwh'].values[0]
+    production = result['self_consumed'].sum() + result['exported'].sum()
+    self_consumption = result['self_consumed'].sum() / production * 100 if production else 0
+    low, high = result['export_credits'].min(), result['export_credits'].max()
+    credited = f"${low:,.0f}" if round(low) == round(high) else f"${low:,.0f}–${high:,.0f} depending on plan"
+    return html.Div([
+        html.P(result['policy'].description, style={"fontSize": "13px", "fontStyle": "italic"}),
+        html.Ul([
+            html.Li(f"Self-consumed: {int(result['self_consumed'].sum()):,} kWh/year ({self_consumption:.0f}% of production)"),
+            html.Li(f"Exported: {int(result['exported'].sum()):,} kWh/year, credited {credited}"),
+        ], style={"fontSize": "14px"}),
+        dbc.Row([
+            dbc.Col(dcc.Graph(figure=flows_fig), width=6),
+            dbc.Col(dcc.Graph(figure=bills_fig), width=6),
+        ]),
+    ])
 
-    for i in years:
-        annual_cost_with = monthly_kwh_usage * price_per_kwh * 12 * (1 - (actual_coverage / 100) * (0.995 ** i)) * ((1.022 / 1.04) ** i)
-        annual_cost_without = monthly_kwh_usage * price_per_kwh * 12 * ((1.022 / 1.04) ** i)
 
-        if i == 1:
-            accum_cost_with.append(annual_cost_with + up_front_cost)
-            accum_cost_without.append(annual_cost_without)
-        else:
-            accum_cost_with.append(accum_cost_with[-1] + annual_cost_with)
-            accum_cost_without.append(accum_cost_without[-1] + annual_cost_without)
-        print(accum_cost_with)
-        print(accum_cost_without)
+@app.callback(
+    Output("solar-simulation-content-2", "children"),
+    Input("solar-location-store", "data"),
+    Input("solar-offset-store", "data"),
+    Input("plan_selector_solar", "value")
+)
+def update_solar_projection(location, offset, selected_plan):
+    if not location or not offset or not selected_plan:
+        return None
 
-    # Total savings over 20 years
-    total_cost_with = accum_cost_with[-1]
-    total_cost_without = accum_cost_without[-1]
-    total_savings = total_cost_without - total_cost_with
+    plans = registry.get().plan_catalog.get(location['zip'])
+    if plans is None:
+        return None
 
-    # Estimate payback year
-    payback_year = None
-    for y in range(20):
-        if accum_cost_with[y] < accum_cost_without[y]:
-            payback_year = y + 1  # Year number (1-indexed)
-            break
+    ######## 20 year projection ########
+    row = plans[plans['plan'] == selected_plan]
+    if len(row) == 0:
+        return None
+    price_per_kwh = float(row['price_per_kwh'][0])
 
+    years, accum_cost_with, accum_cost_without, total_savings, payback = solar_projection(
+        offset['monthly_kwh_usage'], price_per_kwh, offset['actual_coverage']
+    )
 
     # Create figure
     fig = go.Figure()
@@ -1191,33 +1497,62 @@ def update_solar_tab(active_tab, zip_code, monthly_kwh_usage, solar_coverage_rat
         )
     )
 
+    # Payback year across rate increases and system prices
+    sensitivity = solar_sensitivity(offset['monthly_kwh_usage'], price_per_kwh, offset['actual_coverage'])
+    heatmap_fig = go.Figure(go.Heatmap(
+        x=(sensitivity['x'] - 1) * 100,
+        y=sensitivity['y'],
+        z=sensitivity['payback_year'],
+        colorscale='RdYlGn_r',
+        zmin=1,
+        zmax=20,
+        colorbar=dict(title="Payback Year"),
+        hovertemplate="Rate increase: %{x:.1f}%/yr<br>Up-front cost: $%{y:,.0f}<br>Payback year: %{z}<extra></extra>"
+    ))
+    heatmap_fig.add_trace(go.Scatter(
+        x=[(ELECTRICITY_INFLATION - 1) * 100], y=[UP_FRONT_COST], mode='markers',
+        marker=dict(symbol='x', size=12, color='black'), name='Current assumptions', showlegend=False
+    ))
+    heatmap_fig.update_layout(
+        title="Payback Year Sensitivity (blank = beyond 20 years)",
+        xaxis_title="Annual Electricity Rate Increase (%)",
+        yaxis_title="Up-Front Cost ($)",
+        plot_bgcolor="white",
+        margin=dict(t=50, b=50)
+    )
 
-    return html.Div([
-        warning_msg if warning_msg else None,
-        
-        dbc.Row([
-            # Left: Cost & Emissions Savings Chart with heading
-            dbc.Col(html.Div([
-                html.H5(f"Estimated Monthly Solar Savings (Assuming {int(coverage_ratio * 100)}% Offset)"),
-                dcc.Graph(figure=savings_fig)
-            ]), width=6),
+    # Spread of outcomes when the assumptions and usage are uncertain
+    simulation = solar_uncertainty(offset['monthly_kwh_usage'], price_per_kwh, offset['actual_coverage'])
+    fan_fig = fan_chart_figure(simulation, "Cumulative Net Savings from Solar", "Net Savings ($)")
+    payback_fig = go.Figure(go.Bar(
+        x=simulation['years'], y=simulation['payback_share'] * 100, marker_color="#7cc4b0",
+        hovertemplate="Year %{x}: %{y:.1f}% of simulations<extra></extra>"
+    ))
+    payback_fig.update_layout(
+        title="Payback Year Distribution",
+        xaxis_title="Payback Year",
+        yaxis_title="Share of Simulations (%)",
+        plot_bgcolor="white",
+        margin=dict(t=50, b=50)
+    )
 
-            # Right: Monthly Output Chart with heading
-            dbc.Col(html.Div([
-                html.H5(f"Estimated Annual Output: {int(annual_kwh)} kWh"),
-                dcc.Graph(figure=bar_fig)
-            ]), width=6),
-        ], className="mb-4"),
-        html.Hr(),
-    ]), html.Div([
+    return html.Div([
         html.Div([
             html.H5("Summary of Solar Impact", className="mt-4"),
             html.Ul([
-                html.Li(f"Estimated Payback Year: {payback_year if payback_year else 'Beyond 20 years'}"),
-                html.Li(f"Total 20-Year Savings: ${int(total_savings):,}")
+                html.Li(f"Estimated Payback Year: {payback if payback else 'Beyond 20 years'}"),
+                html.Li(f"Total 20-Year Savings: ${int(total_savings):,}"),
+                html.Li(f"Chance of Paying Back Within 20 Years: {(1 - simulation['no_payback_share']) * 100:.0f}%"),
+                html.Li(f"20-Year Savings, 5th–95th Percentile: ${int(simulation['bands'][5][-1]):,} "
+                        f"to ${int(simulation['bands'][95][-1]):,}"),
             ], style={"fontSize": "14px"})
         ]),
         dcc.Graph(figure=fig, style={'width': '100%', 'height': '400px'}),
+        dcc.Graph(figure=heatmap_fig, style={'width': '100%', 'height': '400px'}),
+        dbc.Row([
+            dbc.Col(dcc.Graph(figure=fan_fig, style={'height': '400px'}), width=8),
+            dbc.Col(dcc.Graph(figure=payback_fig, style={'height': '400px'}), width=4),
+        ]),
     ])
 
                    
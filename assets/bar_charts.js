@@ -0,0 +1,110 @@
+// Browser-side versions of update_bar / update_bar_electrification (app2.py).
+//
+// The server sends the current ZIP's plan vectors and zeroed figure templates
+// once (plan-vectors-store); usage edits are recomputed here with the same
+// arithmetic as energy_calc.py, so they never wait on a server round trip.
+
+(function () {
+    var no_update = function () { return window.dash_clientside.no_update; };
+
+    function tieredGasCost(therms, gasAllowance, v) {
+        var baseline = gasAllowance * v.days_per_month;
+        return v.gas_base_price * Math.min(therms, baseline) +
+            v.gas_excess_price * Math.max(0, therms - baseline);
+    }
+
+    function isMissing(values) {
+        return values.some(function (x) { return x === null || x === undefined || x === ''; });
+    }
+
+    // Copy of a template figure with new y values and emissions axis range
+    function fillFigure(template, ys) {
+        var data = template.data.map(function (trace, i) {
+            return Object.assign({}, trace, {y: ys[i]});
+        });
+        var emissions = ys[2].map(function (e, i) { return e + ys[3][i]; });
+        var layout = Object.assign({}, template.layout, {
+            yaxis2: Object.assign({}, template.layout.yaxis2, {
+                range: [0, Math.max.apply(null, emissions) * 1.2]
+            })
+        });
+        return {data: data, layout: layout};
+    }
+
+    // [a0, b0, a1, b1, ...]: each plan's original bar followed by its electrified bar
+    function interleave(a, b) {
+        var out = [];
+        for (var i = 0; i < a.length; i++) {
+            out.push(a[i], b[i]);
+        }
+        return out;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        bar_charts: {
+            base: function (v, kwh, therms, gasAllowance, activeTab) {
+                if (activeTab !== 'tab-base') {
+                    return no_update();
+                }
+                if (!v) {
+                    return {data: [], layout: {}};
+                }
+                if (isMissing([kwh, therms, gasAllowance])) {
+                    return no_update();
+                }
+
+                var gasCost = tieredGasCost(therms, gasAllowance, v);
+                var gasEmissions = v.gas_emissions_kg_per_therm * therms;
+                return fillFigure(v.base_figure, [
+                    v.price_per_kwh.map(function (p) { return p * kwh; }),
+                    v.price_per_kwh.map(function () { return gasCost; }),
+                    v.emissions_g_per_kwh.map(function (e) { return e * kwh / 1000; }),
+                    v.emissions_g_per_kwh.map(function () { return gasEmissions; })
+                ]);
+            },
+
+            electrification: function (activeTab, v, kwh, therms, gasAllowance,
+                                        cop, furnaceEff, heaterEff, furnaceRatio, electrificationPct) {
+                if (activeTab !== 'tab-electrification') {
+                    return no_update();
+                }
+                if (!v) {
+                    return {data: [], layout: {}};
+                }
+                if (isMissing([kwh, therms, gasAllowance, cop, furnaceEff, heaterEff, furnaceRatio, electrificationPct])) {
+                    return no_update();
+                }
+                // The usage below divides by the COP; the server raises PreventUpdate here too
+                if (!(cop > 0)) {
+                    return no_update();
+                }
+
+                // Percentages -> fractions, as in update_bar_electrification
+                var pct = electrificationPct / 100;
+                var furnace = furnaceRatio / 100;
+                var additionalKwh = therms * pct * (
+                    furnace * (furnaceEff / 100) * v.kwh_per_therm / cop +
+                    (1 - furnace) * (heaterEff / 100) * v.kwh_per_therm / cop
+                );
+                var adjustedKwh = kwh + additionalKwh;
+                var reducedGas = therms * (1 - pct);
+
+                var gasCostOrig = tieredGasCost(therms, gasAllowance, v);
+                var gasCostElec = tieredGasCost(reducedGas, gasAllowance, v);
+                var gasEmissionsOrig = v.gas_emissions_kg_per_therm * therms;
+                var gasEmissionsElec = v.gas_emissions_kg_per_therm * reducedGas;
+
+                return fillFigure(v.electrification_figure, [
+                    interleave(v.price_per_kwh.map(function (p) { return p * kwh; }),
+                               v.price_per_kwh.map(function (p) { return p * adjustedKwh; })),
+                    interleave(v.price_per_kwh.map(function () { return gasCostOrig; }),
+                               v.price_per_kwh.map(function () { return gasCostElec; })),
+                    interleave(v.emissions_g_per_kwh.map(function (e) { return e * kwh / 1000; }),
+                               v.emissions_g_per_kwh.map(function (e) { return e * adjustedKwh / 1000; })),
+                    interleave(v.emissions_g_per_kwh.map(function () { return gasEmissionsOrig; }),
+                               v.emissions_g_per_kwh.map(function () { return gasEmissionsElec; }))
+                ]);
+            }
+        }
+    });
+})();
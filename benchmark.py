@@ -0,0 +1,376 @@
+"""Latency, memory and payload benchmarks for the dashboard callbacks.
+
+    python -m benchmark                  # run and compare against the baseline
+    python -m benchmark --save           # run and record a new baseline
+
+The server-side callbacks in CALLBACKS are called directly, once per ZIP
+in the plan catalog with random usage inputs: the bar and pie charts, the
+recommender and Monte Carlo fan chart of the Electrification tab, and the
+Solar tab (its pipeline ending in update_solar_tab, the net metering
+panel and the 20-year projection with its heatmap and fan chart).
+Geocoding and solar output are replaced by local stubs, so no network is
+used and the numbers measure the callbacks rather than PVWatts or
+Nominatim. Memoized callbacks (callback_cache.py) are called through
+``__wrapped__`` and memoized stages are emptied before each call, so every
+call is computed. Callbacks that read the Solar tab's stores get them
+precomputed, outside the timing.
+
+For each callback this reports p50/p95/p99 latency, peak memory allocated
+per call (tracemalloc, on a sample of calls since tracing slows them down)
+and the size of the JSON Dash would send to the browser. A separate
+throughput benchmark scores random households through batch.evaluate_columns,
+and another posts them to /api/v1/evaluate, from request body to response.
+
+With a baseline (BENCHMARK_BASELINE, a JSON file written by --save), the
+run exits with status 1 if any metric in REGRESSION_METRICS got worse by
+more than --threshold. Baselines are machine-specific: record them on the
+machine that runs the comparison. Independently of the baseline, the run
+fails if the API scores fewer than MIN_API_HOUSEHOLDS_PER_S households per
+second.
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import plotly.io.json as plotly_json
+
+import app2
+from batch import DEFAULTS, evaluate_columns
+from data_registry import registry
+from geocode import zip_centroids
+from load_profile import DAYS_IN_MONTH
+
+BENCHMARK_BASELINE = os.environ.get('BENCHMARK_BASELINE', 'benchmark_baseline.json')
+REGRESSION_THRESHOLD = 0.25
+# Metrics compared against the baseline, and whether higher is worse
+REGRESSION_METRICS = {'p50_ms': True, 'p95_ms': True, 'peak_kb': True, 'payload_kb': True,
+                      'households_per_s': False}
+# Latency changes smaller than this are timer noise, whatever the percentage
+MIN_LATENCY_CHANGE_MS = 0.5
+TRACED_CALLS = 50
+THROUGHPUT_HOUSEHOLDS = 200_000
+# End-to-end target for the batch API on one core
+MIN_API_HOUSEHOLDS_PER_S = 100_000
+
+# Typical monthly share of annual output in California, for the stub solar response
+STUB_MONTHLY_SHAPE = np.array([5.2, 6.2, 8.1, 9.3, 10.4, 10.8, 11.1, 10.6, 9.2, 7.6, 5.9, 5.6]) / 100
+STUB_KWH_PER_KW = 1500
+
+
+def stub_latlon(zip_code, fallback=None):
+    """Bundled centroid, or a fixed point in California instead of asking Nominatim."""
+    return zip_centroids.get(zip_code, (37.0, -120.0))
+
+
+def stub_solar_potential(lat, lon, system_capacity_kw=4.0, *args, **kwargs):
+    """PVWatts-shaped response without calling PVWatts or running the local model."""
+    monthly = STUB_MONTHLY_SHAPE * STUB_KWH_PER_KW * system_capacity_kw
+    return {'outputs': {'ac_monthly': monthly.tolist(), 'ac_annual': float(monthly.sum())}}
+
+
+def stub_hourly_production(lat, lon, system_capacity_kw=4.0, *args, **kwargs):
+    """The stub's monthly output spread over 8760 hours, producing from 6am to 6pm."""
+    month_of_day = np.repeat(np.arange(12), DAYS_IN_MONTH)
+    daily = (STUB_MONTHLY_SHAPE * STUB_KWH_PER_KW * system_capacity_kw / DAYS_IN_MONTH)[month_of_day]
+    daylight = np.clip(np.sin((np.arange(24) - 6) / 12 * np.pi), 0, None)
+    hourly = (daily[:, np.newaxis] * daylight / daylight.sum()).ravel().astype(np.float32)
+    hourly.setflags(write=False)
+    return hourly
+
+
+def random_inputs(rng):
+    """Dashboard inputs drawn across their realistic ranges."""
+    return {
+        'kwh': round(rng.uniform(100, 1500), 1),
+        'therms': round(rng.uniform(5, 80), 1),
+        'gas_allowance': round(rng.uniform(0.5, 2.5), 2),
+        'cop': round(rng.uniform(2, 5), 1),
+        'furnace_eff': round(rng.uniform(70, 98)),
+        'heater_eff': round(rng.uniform(60, 95)),
+        'furnace_ratio': round(rng.uniform(0, 100)),
+        'electrification_pct': round(rng.uniform(0, 100)),
+        'roof_sqft': round(rng.uniform(100, 1500), -1),
+        'solar_coverage': round(rng.uniform(10, 100)),
+    }
+
+
+def solar_pipeline(zip_code, inputs):
+    # The Solar tab's store callbacks, as the browser runs them
+    location = app2.update_solar_location('tab-solar', zip_code)
+    solar = app2.update_solar_yield(location, inputs['roof_sqft'], *app2.DEFAULT_SOLAR_SETTINGS)
+    offset = app2.update_solar_offset(solar, inputs['kwh'], inputs['solar_coverage'])
+    return location, solar, offset
+
+
+@functools.lru_cache(maxsize=None)
+def _solar_stores(zip_code, roof_sqft, kwh, solar_coverage):
+    return solar_pipeline(zip_code, {'roof_sqft': roof_sqft, 'kwh': kwh, 'solar_coverage': solar_coverage})
+
+
+def solar_stores(zip_code, plan, inputs):
+    """The Solar tab's (location, yield, offset) stores for a case, computed once."""
+    return _solar_stores(zip_code, inputs['roof_sqft'], inputs['kwh'], inputs['solar_coverage'])
+
+
+def cold(*stages):
+    """Empties memoized stages so the next call computes them."""
+    for memoized in stages:
+        memoized.cache_clear()
+
+
+def solar_tab(zip_code, inputs):
+    # The Solar tab's pipeline of store callbacks, with its memoized stages emptied so every call is cold
+    cold(app2.solar_yield, app2.solar_offset)
+    return app2.update_solar_tab.__wrapped__(*solar_pipeline(zip_code, inputs))
+
+
+def solar_projection(zip_code, plan, inputs):
+    cold(app2.solar_projection, app2.solar_sensitivity, app2.solar_uncertainty)
+    location, _, offset = solar_stores(zip_code, plan, inputs)
+    return app2.update_solar_projection(location, offset, plan)
+
+
+def solar_net_metering(zip_code, plan, inputs):
+    location, solar, offset = solar_stores(zip_code, plan, inputs)
+    return app2.update_solar_net_metering(location, solar, offset, NET_METERING_POLICY)
+
+
+def electrification_fan_chart(zip_code, plan, i):
+    cold(app2.electrification_uncertainty)
+    return app2.update_electrification_fan_chart(
+        zip_code, plan, i['kwh'], i['therms'], i['gas_allowance'], i['cop'], i['furnace_eff'],
+        i['heater_eff'], i['furnace_ratio'], i['electrification_pct'])
+
+
+def recommendations(zip_code, plan, i):
+    # As on the Electrification tab before the Solar tab was opened: no solar stores
+    cold(app2.local_solar_kwh_per_kw)
+    return app2.update_recommendations(
+        zip_code, i['kwh'], i['therms'], i['gas_allowance'], i['cop'], i['furnace_eff'], i['heater_eff'],
+        i['furnace_ratio'], i['electrification_pct'], None, None)
+
+
+NET_METERING_POLICY = next(iter(registry.get().net_metering), None)
+
+
+CALLBACKS = {
+    'update_bar': lambda zip_code, plan, i: app2.update_bar.__wrapped__(
+        zip_code, i['kwh'], i['therms'], i['gas_allowance'], 'tab-base'),
+    'update_bar_electrification': lambda zip_code, plan, i: app2.update_bar_electrification.__wrapped__(
+        'tab-electrification', zip_code, i['kwh'], i['therms'], i['gas_allowance'], i['cop'],
+        i['furnace_eff'], i['heater_eff'], i['furnace_ratio'], i['electrification_pct']),
+    'update_pie_chart': lambda zip_code, plan, i: app2.update_pie_chart(plan),
+    'update_recommendations': recommendations,
+    'update_electrification_fan_chart': electrification_fan_chart,
+    'update_solar_tab': lambda zip_code, plan, i: solar_tab(zip_code, i),
+    'update_solar_net_metering': solar_net_metering,
+    'update_solar_projection': solar_projection,
+}
+# Run for every case before the timing: inputs a callback reads from other callbacks' stores
+SETUP = {
+    'update_solar_net_metering': solar_stores,
+    'update_solar_projection': solar_stores,
+}
+
+
+def scenarios(seed, repeat):
+    """(zip, plan, inputs) for every ZIP in the catalog, repeat times, with random plan and inputs."""
+    rng = np.random.default_rng(seed)
+    catalog = registry.get().plan_catalog
+    cases = []
+    for _ in range(repeat):
+        for zip_code, plans in catalog.items():
+            plan = str(rng.choice(plans['plan'])) if len(plans) else None
+            cases.append((zip_code, plan, random_inputs(rng)))
+    return cases
+
+
+def percentiles_ms(seconds):
+    p50, p95, p99 = np.percentile(np.asarray(seconds) * 1000, [50, 95, 99])
+    return {'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3)}
+
+
+def bench_callback(fn, cases, setup=None):
+    """Latency percentiles, peak allocation and payload size of one callback over the cases."""
+    if setup is not None:
+        for case in cases:
+            setup(*case)
+    fn(*cases[0])  # warm up imports and module-level caches
+
+    seconds, outputs = [], []
+    for case in cases:
+        started = time.perf_counter()
+        output = fn(*case)
+        seconds.append(time.perf_counter() - started)
+        outputs.append(output)
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for case in cases[:TRACED_CALLS]:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn(*case)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    # The JSON Dash sends for the callback's output
+    payloads = [len(plotly_json.to_json_plotly(output)) for output in outputs]
+    return {
+        'calls': len(cases),
+        **percentiles_ms(seconds),
+        'peak_kb': round(float(np.median(peaks)) / 1024, 1),
+        'payload_kb': round(float(np.median(payloads)) / 1024, 1),
+        'max_payload_kb': round(max(payloads) / 1024, 1),
+    }
+
+
+def random_households(seed, n_households=THROUGHPUT_HOUSEHOLDS):
+    """Column arrays of households in random catalog ZIPs with random usage."""
+    rng = np.random.default_rng(seed)
+    columns = {'zip': rng.choice(np.array(list(registry.get().plan_catalog), dtype=str), n_households)}
+    for field, default in DEFAULTS.items():
+        columns[field] = np.full(n_households, float(default))
+    columns['kwh'] = rng.uniform(100, 1500, n_households)
+    columns['therms'] = rng.uniform(5, 80, n_households)
+    columns['electrification_pct'] = rng.uniform(0, 100, n_households)
+    return columns
+
+
+def bench_throughput(seed, n_households=THROUGHPUT_HOUSEHOLDS, rounds=3):
+    """Households per second through the batch evaluator (best of rounds)."""
+    data = registry.get()
+    columns = random_households(seed, n_households)
+
+    best = np.inf
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in evaluate_columns(columns, data.plan_catalog, data.gas_base_price, data.gas_excess_price):
+            pass
+        best = min(best, time.perf_counter() - started)
+    return {'households': n_households, 'households_per_s': round(n_households / best)}
+
+
+def bench_api_throughput(seed, n_households=THROUGHPUT_HOUSEHOLDS, rounds=2):
+    """Households per second through POST /api/v1/evaluate, parsing and encoding included (best of rounds)."""
+    columns = random_households(seed, n_households)
+    body = json.dumps(pd.DataFrame(columns).to_dict('records'))
+    client = app2.app.server.test_client()
+
+    best = np.inf
+    for _ in range(rounds):
+        started = time.perf_counter()
+        response = client.post('/api/v1/evaluate', data=body, content_type='application/json')
+        response.get_data()
+        best = min(best, time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/v1/evaluate returned {response.status_code}: {response.get_data(as_text=True)}")
+    return {'households': n_households, 'households_per_s': round(n_households / best)}
+
+
+def run(seed=0, repeat=1, names=None):
+    cases = scenarios(seed, repeat)
+    results = {}
+    with mock.patch('app2.zip_to_latlon', stub_latlon), \
+            mock.patch('app2.fetch_solar_potential', stub_solar_potential), \
+            mock.patch('app2.fetch_hourly_production', stub_hourly_production):
+        for name, fn in CALLBACKS.items():
+            if names and name not in names:
+                continue
+            results[name] = bench_callback(fn, cases, SETUP.get(name))
+    if not names or 'batch_throughput' in names:
+        results['batch_throughput'] = bench_throughput(seed)
+    if not names or 'api_throughput' in names:
+        results['api_throughput'] = bench_api_throughput(seed)
+    return results
+
+
+def regressions(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Descriptions of every metric worse than the baseline by more than threshold (a fraction)."""
+    found = []
+    for name, metrics in results.items():
+        for metric, higher_is_worse in REGRESSION_METRICS.items():
+            old = baseline.get(name, {}).get(metric)
+            new = metrics.get(metric)
+            if old is None or new is None or old == 0:
+                continue
+            change = (new - old) / old if higher_is_worse else (old - new) / old
+            if metric.endswith('_ms') and new - old < MIN_LATENCY_CHANGE_MS:
+                continue
+            if change > threshold:
+                found.append(f"{name} {metric}: {old} -> {new} ({change:+.0%} worse)")
+    return found
+
+
+def below_target(results):
+    """Descriptions of absolute targets the results miss, whatever the baseline."""
+    rate = results.get('api_throughput', {}).get('households_per_s')
+    if rate is not None and rate < MIN_API_HOUSEHOLDS_PER_S:
+        return [f"api_throughput households_per_s: {rate} < {MIN_API_HOUSEHOLDS_PER_S} target"]
+    return []
+
+
+def print_table(results, baseline):
+    print(f"{'benchmark':<34}{'metric':<18}{'value':>12}{'baseline':>12}")
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric, '')
+            print(f"{name:<34}{metric:<18}{value:>12}{old:>12}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--baseline', default=BENCHMARK_BASELINE, help=f"baseline file (default {BENCHMARK_BASELINE})")
+    parser.add_argument('--save', action='store_true', help="write the results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help=f"allowed slowdown as a fraction (default {REGRESSION_THRESHOLD})")
+    parser.add_argument('--repeat', type=int, default=1, help="passes over every ZIP (default 1)")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the random inputs")
+    parser.add_argument('--only', nargs='+', choices=list(CALLBACKS) + ['batch_throughput', 'api_throughput'],
+                        help="run only these benchmarks")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args.seed, args.repeat, args.only)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    print_table(results, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'results': results}, f, indent=2)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'seed': args.seed, 'repeat': args.repeat,
+                       'results': results}, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    missed = below_target(results)
+    found = regressions(results, baseline, args.threshold)
+    for line in missed:
+        print(f"\n{line}")
+    if found:
+        print(f"\n{len(found)} regression(s) beyond {args.threshold:.0%}:")
+        for line in found:
+            print(f"  {line}")
+    if missed or found:
+        sys.exit(1)
+    if baseline:
+        print(f"\nNo regressions beyond {args.threshold:.0%}.")
+
+
+if __name__ == '__main__':
+    main()
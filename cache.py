@@ -0,0 +1,211 @@
+"""Small two-tier (memory + SQLite) cache used for expensive lookups.
+
+Keys are content addresses: a SHA-256 of the namespace and the canonical JSON
+of the parameters, so the same inputs always map to the same entry no matter
+which process computed it.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+_MISSING = object()
+
+# Objects whose _lock is replaced in forked children: a lock held by another
+# thread at fork time would otherwise stay locked forever in the child
+_fork_locked = weakref.WeakSet()
+
+
+def _reset_locks_after_fork():
+    for obj in _fork_locked:
+        obj._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_locks_after_fork)
+
+
+def reset_lock_after_fork(obj):
+    """Gives obj a fresh ``_lock`` in every process forked from this one."""
+    _fork_locked.add(obj)
+
+
+def make_key(namespace, params):
+    """Content-addressed key for a dict of (already normalized) parameters."""
+    payload = json.dumps([namespace, params], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        reset_lock_after_fork(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """On-disk cache with a TTL and a total size limit.
+
+    Values are stored as bytes produced by ``dumps`` (JSON by default). When
+    the stored size exceeds ``max_bytes`` the least recently used entries are
+    evicted. Expired entries and the total size are checked every
+    ``evict_every`` writes, or sooner once this process's writes alone could
+    exceed the limit, so other processes' writes may overshoot it briefly.
+    Safe to share between threads and between worker processes, including
+    ones forked after the cache was created: each process opens its own
+    connection (creating the file and its directory) on first use.
+    """
+
+    def __init__(self, path, ttl=30 * 24 * 3600, max_bytes=64 * 1024 * 1024,
+                 dumps=None, loads=None, evict_every=64):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self.dumps = dumps or (lambda value: json.dumps(value).encode('utf-8'))
+        self.loads = loads or (lambda data: json.loads(data))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        reset_lock_after_fork(self)
+        # pid -> connection. SQLite connections must not be used across fork,
+        # and ones inherited from the parent are left alone rather than closed
+        self._connections = {}
+        # Writes since the last eviction check, and the total size it found plus
+        # this process's writes since; the first write runs a check
+        self._writes = evict_every
+        self._size = 0
+
+    def _connection(self):
+        conn = self._connections.get(os.getpid())
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+            self._connections[os.getpid()] = conn
+        return conn
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                if row is not None:
+                    conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self.misses += 1
+                return default
+            conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return self.loads(row[0])
+
+    def set(self, key, value):
+        data = self.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now, now)
+            )
+            self._writes += 1
+            self._size += len(data)
+            if self._writes >= self.evict_every or (self.max_bytes is not None and self._size > self.max_bytes):
+                self._evict(now)
+
+    def _evict(self, now):
+        # Both statements scan the whole table, so set() runs this only now and then
+        conn = self._connection()
+        self._writes = 0
+        self._size = 0
+        if self.ttl is not None:
+            conn.execute("DELETE FROM cache WHERE created < ?", (now - self.ttl,))
+        if self.max_bytes is None:
+            return
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        self._size = total
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until we are back under the limit
+        rows = conn.execute("SELECT key, size FROM cache ORDER BY accessed").fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM cache WHERE key = ?", stale)
+        self._size = total
+
+    def clear(self):
+        with self._lock:
+            self._connection().execute("DELETE FROM cache")
+            self._size = 0
+
+
+class TieredCache:
+    """Memory LRU in front of an optional disk cache."""
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key, default=None):
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key, _MISSING)
+            if value is not _MISSING:
+                self.memory.set(key, value)
+                return value
+        return default
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
@@ -0,0 +1,140 @@
+"""Memoization of Dash callback outputs, shared between worker processes.
+
+``@memoize_callback(name)`` caches what a callback returns, keyed on its
+normalized arguments (strings stripped, numbers rounded to FLOAT_DECIMALS,
+stores compared by value) and on the rate data the snapshot was built from.
+Outputs are stored as the JSON Dash sends to the browser, in a per-process
+LRU in front of a SQLite file (CALLBACK_CACHE_PATH) that every worker on the
+machine shares. So a popular ZIP with default inputs is computed once, not
+once per visitor and worker.
+
+Keys include the snapshot's source file mtimes rather than its version
+number: version numbers are per process, while the mtimes name the same
+data in every worker. New rate data therefore never serves old outputs; the
+stale entries age out of the LRU and the disk cache's TTL/size limit.
+
+Only pure callbacks should be memoized. Calls that depend on what triggered
+them can bypass the cache with ``skip_if``; ``dash.Patch`` results and
+exceptions (e.g. PreventUpdate) are never cached.
+"""
+import functools
+import json
+import os
+import threading
+
+import dash
+import numpy as np
+import plotly.io.json as plotly_json
+
+from cache import LRUCache, SQLiteCache, make_key, reset_lock_after_fork
+from data_registry import registry
+
+CALLBACK_CACHE_PATH = os.environ.get('CALLBACK_CACHE_PATH', '.cache/callbacks.sqlite')
+CALLBACK_CACHE_SIZE = int(os.environ.get('CALLBACK_CACHE_SIZE', 256))
+CALLBACK_CACHE_TTL = float(os.environ.get('CALLBACK_CACHE_TTL', 24 * 3600))
+CALLBACK_CACHE_MAX_BYTES = int(os.environ.get('CALLBACK_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+FLOAT_DECIMALS = 6
+
+disk_cache = (SQLiteCache(CALLBACK_CACHE_PATH, ttl=CALLBACK_CACHE_TTL, max_bytes=CALLBACK_CACHE_MAX_BYTES)
+              if CALLBACK_CACHE_PATH else None)
+
+# name -> CallbackCache of every memoized callback
+callback_caches = {}
+
+
+def normalize(value):
+    """JSON-ready copy of a callback argument in which equivalent inputs compare equal."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, str):
+        return value.strip()
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return round(float(value), FLOAT_DECIMALS)
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [normalize(v) for v in value]
+    return value
+
+
+class CallbackCache:
+    """Memory LRU and shared disk tier for one callback, with hit/miss counters."""
+
+    def __init__(self, name, maxsize=CALLBACK_CACHE_SIZE, disk=disk_cache):
+        self.name = name
+        self.memory = LRUCache(maxsize)
+        self.disk = disk
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'skipped': 0}
+        self._lock = threading.Lock()
+        reset_lock_after_fork(self)
+
+    def count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def key(self, args, kwargs):
+        return make_key(f'callback-{self.name}', {
+            'data': registry.get().mtimes,
+            'args': normalize(list(args)),
+            'kwargs': normalize(kwargs),
+        })
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self.count('hits')
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+                self.count('disk_hits')
+                return value
+        self.count('misses')
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+
+def memoize_callback(name, skip_if=None, maxsize=CALLBACK_CACHE_SIZE, disk=disk_cache):
+    """Decorator caching a pure callback's output (see module docstring).
+
+    skip_if(*args, **kwargs) returning True runs the callback uncached. The
+    undecorated function is available as ``__wrapped__``.
+    """
+    cache = callback_caches[name] = CallbackCache(name, maxsize, disk)
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if skip_if is not None and skip_if(*args, **kwargs):
+                cache.count('skipped')
+                return fn(*args, **kwargs)
+
+            key = cache.key(args, kwargs)
+            output = cache.get(key)
+            if output is not None:
+                return output
+
+            output = fn(*args, **kwargs)
+            if isinstance(output, dash.Patch) or output is dash.no_update:
+                return output
+            # Figures and components as the plain JSON Dash would send, so every tier stores the same thing
+            output = json.loads(plotly_json.to_json_plotly(output))
+            cache.set(key, output)
+            return output
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def cache_stats():
+    """{callback name: hit/miss counters and entries in memory}."""
+    return {name: {**cache.stats, 'size': len(cache.memory)} for name, cache in callback_caches.items()}
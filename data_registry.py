@@ -0,0 +1,150 @@
+"""Rate data shared by the dashboard callbacks, reloaded when the files change.
+
+The registry loads the data files on first use and builds everything the
+callbacks need from them (a ``DataSnapshot``). A daemon thread polls the
+files' modification times and, when one changes, builds a new snapshot in
+the background and swaps it in with a single assignment. Callbacks call
+``registry.get()`` once and read only that snapshot, so a request never
+sees half-updated data. New rate data rolls out without a restart, and the
+old snapshot is served until the new one is ready.
+
+Under a pre-fork server (wsgi.py) the master calls ``preload()`` and the
+workers share its snapshot; the master reloads it and replaces the workers.
+"""
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+from cache import reset_lock_after_fork
+from load_profile import ELEC_FACTORS
+from plan_catalog import build_plan_catalog
+from power_mix import build_pie_figures
+from tariffs import TARIFFS_PATH, average_prices, load_net_metering, load_tariffs, two_tier_prices
+from zip_plans import ZIP_CCA_PATH, ZIP_PLANS_PATH, load_zip_plans
+
+logger = logging.getLogger(__name__)
+
+PLAN_DETAILS_PATH = 'data/plan_details.csv'
+
+# Seconds between checks for changed data files; 0 disables reloading
+RELOAD_INTERVAL = float(os.environ.get('DATA_RELOAD_INTERVAL', 5))
+
+DataSnapshot = namedtuple('DataSnapshot', [
+    'version',              # increases by one with every reload
+    'mtimes',               # source file mtimes the snapshot was built from
+    'zip_to_plans',         # ZIP -> list of plan names
+    'plan_details_df',
+    'tariffs',              # electricity billing Schedule, one plan per plan_details_df row
+    'gas_tariff',           # gas billing Schedule (see tariffs.py)
+    'net_metering',         # policy name -> NetMeteringPolicy
+    'plan_catalog',         # ZIP -> record array of plans (see plan_catalog.py)
+    'pie_figures',          # plan -> power mix figure dict (see power_mix.py)
+    'gas_base_price',       # $/therm within the baseline allowance
+    'gas_excess_price',     # $/therm above it
+])
+
+
+def load_snapshot(version, mtimes, zip_cca_path=ZIP_CCA_PATH, zip_plans_path=ZIP_PLANS_PATH,
+                  plan_details_path=PLAN_DETAILS_PATH, tariffs_path=TARIFFS_PATH):
+    """Reads the data files and builds the indexes derived from them."""
+    zip_to_plans = load_zip_plans(zip_plans_path, zip_cca_path)
+    plan_details_df = pd.read_csv(plan_details_path)
+    tariffs, gas_tariff = load_tariffs(plan_details_df, tariffs_path)
+    # Price each plan by its tariff (one per row), so TOU plans aren't billed at the CSV's flat price
+    plan_details_df = plan_details_df.assign(price_per_kwh=average_prices(tariffs, ELEC_FACTORS))
+    gas_base_price, gas_excess_price = two_tier_prices(gas_tariff)
+
+    return DataSnapshot(
+        version=version,
+        mtimes=mtimes,
+        zip_to_plans=zip_to_plans,
+        plan_details_df=plan_details_df,
+        tariffs=tariffs,
+        gas_tariff=gas_tariff,
+        net_metering=load_net_metering(tariffs_path),
+        plan_catalog=build_plan_catalog(zip_to_plans, plan_details_df),
+        pie_figures=build_pie_figures(plan_details_df),
+        gas_base_price=gas_base_price,
+        gas_excess_price=gas_excess_price,
+    )
+
+
+class DataRegistry:
+    """Lazily loaded, hot-reloaded rate data (see module docstring)."""
+
+    def __init__(self, reload_interval=RELOAD_INTERVAL, **paths):
+        self.reload_interval = reload_interval
+        self.paths = paths
+        self._snapshot = None
+        self._lock = threading.Lock()
+        reset_lock_after_fork(self)
+        self._watcher_pid = None
+        self._failed_mtimes = None
+
+    def _sources(self):
+        return [self.paths.get('zip_cca_path', ZIP_CCA_PATH),
+                self.paths.get('plan_details_path', PLAN_DETAILS_PATH),
+                self.paths.get('tariffs_path', TARIFFS_PATH)]
+
+    def _mtimes(self):
+        return tuple(os.stat(path).st_mtime_ns for path in self._sources())
+
+    def get(self):
+        """The current snapshot, loading it on first use."""
+        snapshot = self.preload()
+        self._ensure_watcher()
+        return snapshot
+
+    def preload(self):
+        """Loads the snapshot without starting the watcher thread (e.g. before forking workers)."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = load_snapshot(1, self._mtimes(), **self.paths)
+                snapshot = self._snapshot
+        return snapshot
+
+    def reload(self, force=False):
+        """Builds and swaps in a new snapshot if any source file changed. Returns True if it did."""
+        with self._lock:
+            mtimes = self._mtimes()
+            current = self._snapshot
+            if not force and (mtimes == self._failed_mtimes or (current is not None and current.mtimes == mtimes)):
+                return False
+            version = current.version + 1 if current is not None else 1
+            try:
+                snapshot = load_snapshot(version, mtimes, **self.paths)
+            except Exception:
+                # Don't retry the same broken files until they change again
+                self._failed_mtimes = mtimes
+                raise
+            self._snapshot = snapshot
+        logger.info("Loaded rate data version %d", snapshot.version)
+        return True
+
+    def _ensure_watcher(self):
+        # Threads don't survive fork, so each worker process starts its own
+        if not self.reload_interval or self._watcher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+        threading.Thread(target=self._watch, name='data-registry-watcher', daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.reload_interval)
+            try:
+                self.reload()
+            except Exception:
+                # Half-written or invalid files: keep serving the current snapshot
+                logger.exception("Reloading rate data failed; keeping version %d", self._snapshot.version)
+
+
+registry = DataRegistry()
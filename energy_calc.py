@@ -0,0 +1,93 @@
+"""Cost and emissions calculations shared by the dashboards.
+
+Everything here is plain NumPy so it can be used outside Dash (batch API,
+scripts). Usage arguments may be scalars or arrays of households; plan
+arguments are 1-D arrays with one entry per plan. Results have shape
+``usage_shape + (n_plans,)``.
+"""
+import numpy as np
+
+GAS_EMISSIONS_KG_PER_THERM = 5.3  # kg CO₂ per therm
+KWH_PER_THERM = 29.3
+DAYS_PER_MONTH = 30
+
+
+def _usage(x):
+    # Add a trailing plan axis so household arrays broadcast against plan arrays
+    return np.asarray(x, dtype=float)[..., np.newaxis]
+
+
+def tiered_gas_cost(therms, gas_allowance, base_price, excess_price, days=DAYS_PER_MONTH):
+    """Monthly gas bill with baseline allowance (therms/day) billed at the base price."""
+    therms = np.asarray(therms, dtype=float)
+    baseline = np.asarray(gas_allowance, dtype=float) * days
+    return base_price * np.minimum(therms, baseline) + excess_price * np.maximum(0, therms - baseline)
+
+
+def electrified_usage(kwh, therms, cop, furnace_eff, heater_eff, furnace_ratio,
+                      electrification_pct, heater_ratio=None):
+    """Returns (adjusted_kwh, reduced_gas) after moving gas load to heat pumps.
+
+    Efficiencies, ratios and electrification_pct are fractions (0-1). If
+    heater_ratio is omitted the water heater takes the rest of the gas usage.
+    """
+    kwh = np.asarray(kwh, dtype=float)
+    therms = np.asarray(therms, dtype=float)
+    if heater_ratio is None:
+        heater_ratio = 1 - np.asarray(furnace_ratio, dtype=float)
+
+    additional_kwh = therms * electrification_pct * (
+        furnace_ratio * furnace_eff * KWH_PER_THERM / cop +
+        heater_ratio * heater_eff * KWH_PER_THERM / cop
+    )
+    reduced_gas = therms * (1 - electrification_pct)
+    return kwh + additional_kwh, reduced_gas
+
+
+def evaluate_plans(kwh, therms, gas_allowance, price_per_kwh, emissions_g_per_kwh,
+                   gas_base_price, gas_excess_price, cop=4.0, furnace_eff=0.8, heater_eff=0.8,
+                   furnace_ratio=0.6, electrification_pct=0.0, heater_ratio=None):
+    """Original and electrified monthly cost and emissions for every plan in one pass.
+
+    Returns a dict of arrays (costs in $, emissions in kg CO₂):
+    elec_cost_orig, elec_cost_elec, gas_cost_orig, gas_cost_elec,
+    elec_emissions_orig, elec_emissions_elec, gas_emissions_orig, gas_emissions_elec.
+    Raises ValueError if cop is not positive.
+    """
+    if np.any(np.asarray(cop, dtype=float) <= 0):
+        # Electrified usage divides by the COP
+        raise ValueError("COP must be positive.")
+    price_per_kwh = np.asarray(price_per_kwh, dtype=float)
+    emissions_g_per_kwh = np.asarray(emissions_g_per_kwh, dtype=float)
+
+    adjusted_kwh, reduced_gas = electrified_usage(
+        kwh, therms, cop, furnace_eff, heater_eff, furnace_ratio, electrification_pct, heater_ratio
+    )
+
+    kwh = _usage(kwh)
+    therms = _usage(therms)
+    gas_allowance = _usage(gas_allowance)
+    adjusted_kwh = _usage(adjusted_kwh)
+    reduced_gas = _usage(reduced_gas)
+
+    shape = np.broadcast_shapes(kwh.shape, therms.shape, gas_allowance.shape, adjusted_kwh.shape,
+                                price_per_kwh.shape)
+
+    def full(x):
+        return np.broadcast_to(x, shape)
+
+    return {
+        'elec_cost_orig': full(price_per_kwh * kwh),
+        'elec_cost_elec': full(price_per_kwh * adjusted_kwh),
+        'gas_cost_orig': full(tiered_gas_cost(therms, gas_allowance, gas_base_price, gas_excess_price)),
+        'gas_cost_elec': full(tiered_gas_cost(reduced_gas, gas_allowance, gas_base_price, gas_excess_price)),
+        'elec_emissions_orig': full(emissions_g_per_kwh * kwh / 1000),
+        'elec_emissions_elec': full(emissions_g_per_kwh * adjusted_kwh / 1000),
+        'gas_emissions_orig': full(GAS_EMISSIONS_KG_PER_THERM * therms),
+        'gas_emissions_elec': full(GAS_EMISSIONS_KG_PER_THERM * reduced_gas),
+    }
+
+
+def interleave(orig, elec):
+    """[orig0, elec0, orig1, elec1, ...] so each plan's bars sit side by side."""
+    return np.column_stack((orig, elec)).ravel()
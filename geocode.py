@@ -0,0 +1,58 @@
+"""ZIP code -> (lat, lon) lookup.
+
+Uses the bundled centroid table (data/zip_centroids.csv), which covers every
+ZIP in zip_code_data.csv, so the Solar tab works without network access.
+Nominatim is only consulted for ZIPs missing from the table, and only when
+NOMINATIM_FALLBACK=1 is set.
+"""
+import csv
+import functools
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+ZIP_CENTROIDS_PATH = 'data/zip_centroids.csv'
+NOMINATIM_FALLBACK = os.environ.get('NOMINATIM_FALLBACK', '0') == '1'
+
+
+def load_zip_centroids(path=ZIP_CENTROIDS_PATH):
+    """Reads the centroid table into a dict of ZIP -> (lat, lon)."""
+    with open(path, newline='') as file:
+        return {row['zip']: (float(row['lat']), float(row['lon'])) for row in csv.DictReader(file)}
+
+
+zip_centroids = load_zip_centroids()
+
+
+@functools.lru_cache(maxsize=1)
+def _geolocator():
+    # geopy is only needed for the fallback, so import it lazily
+    from geopy.geocoders import Nominatim
+    return Nominatim(user_agent="solar_app")
+
+
+@functools.lru_cache(maxsize=1024)
+def _nominatim_latlon(zip_code):
+    # Errors propagate, so only answers are memoized and a failed lookup is retried next time
+    location = _geolocator().geocode({"postalcode": zip_code}, timeout=5)
+    if location:
+        return location.latitude, location.longitude
+    return None, None
+
+
+def zip_to_latlon(zip_code, fallback=None):
+    """Returns (lat, lon) for a ZIP code, or (None, None) if it can't be located."""
+    latlon = zip_centroids.get(zip_code)
+    if latlon is not None:
+        return latlon
+
+    if fallback is None:
+        fallback = NOMINATIM_FALLBACK
+    if not fallback:
+        return None, None
+    try:
+        return _nominatim_latlon(zip_code)
+    except Exception as e:
+        logger.warning("Geocoding %s failed: %s", zip_code, e)
+        return None, None
@@ -0,0 +1,17 @@
+"""gunicorn settings for wsgi.py, read from the working directory."""
+from data_registry import RELOAD_INTERVAL, registry
+
+# create_app builds the shared data in the master before the workers fork
+preload_app = True
+
+
+def when_ready(server):
+    if server.cfg.preload_app and RELOAD_INTERVAL:
+        import wsgi
+        wsgi.watch_data(server.pid, RELOAD_INTERVAL)
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        # The master reloads the data and replaces the workers (wsgi.watch_data)
+        registry.reload_interval = 0
@@ -0,0 +1,220 @@
+"""Pooled, fault-tolerant JSON-over-HTTP client for external APIs (PVWatts).
+
+One ``JSONClient`` per API is shared by every request in the process:
+
+* A ``requests.Session`` keeps connections alive in a bounded pool, so only
+  the first request pays for the TCP/TLS handshake. Each process (e.g. a
+  forked web worker) gets its own session.
+* Every request has connect and read timeouts, so a slow API can't hold a
+  worker indefinitely.
+* Connection errors, timeouts, 429 and 5xx responses are retried with
+  exponential backoff and full jitter (honoring Retry-After up to the cap).
+* A circuit breaker fails fast after repeated failures and lets one trial
+  request through once ``reset_after`` seconds have passed.
+* Concurrent calls with identical parameters are coalesced (single-flight):
+  one request goes out and every caller gets its result.
+
+Failures are logged and ``get_json`` returns None, so callers degrade to
+"no data" instead of raising into a Dash callback.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+_clients = weakref.WeakSet()
+
+
+def _reset_clients_after_fork():
+    for client in _clients:
+        client._after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_clients_after_fork)
+
+
+class CircuitBreaker:
+    """Opens after ``max_failures`` consecutive failures; half-opens after ``reset_after`` seconds."""
+
+    def __init__(self, max_failures=5, reset_after=30.0, clock=time.monotonic):
+        self.max_failures = max_failures
+        self.reset_after = reset_after
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if self.clock() - self.opened_at >= self.reset_after else 'open'
+
+    def allow(self):
+        """True if a request may go out now."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.clock() - self.opened_at >= self.reset_after:
+                # Half-open: one trial request goes out, the rest wait another period
+                self.opened_at = self.clock()
+                return True
+            return False
+
+    def record(self, success):
+        with self._lock:
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.max_failures:
+                # A failed trial request restarts the wait
+                self.opened_at = self.clock()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SingleFlight:
+    """Runs a function once per key at a time; concurrent callers with the same key share the result."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """(result, shared): shared is True if another caller's in-flight call supplied the result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            return call.result, True
+        try:
+            call.result = fn()
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class JSONClient:
+    """GETs JSON from one URL with pooling, timeouts, retries, a circuit breaker and single-flight."""
+
+    def __init__(self, url, connect_timeout=3.05, read_timeout=10.0, retries=2, backoff=0.5,
+                 backoff_cap=8.0, pool_size=10, breaker=None, sleep=time.sleep):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+        self.sleep = sleep
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'coalesced': 0, 'rejected': 0}
+        self._single_flight = SingleFlight()
+        self._sessions = {}  # pid -> Session; pooled sockets must not be shared across fork
+        self._lock = threading.Lock()
+        _clients.add(self)
+
+    def _after_fork(self):
+        # Locks and in-flight calls belong to the parent's threads, which don't exist here
+        self._lock = threading.Lock()
+        self._single_flight = SingleFlight()
+        self.breaker._lock = threading.Lock()
+
+    def _session(self):
+        pid = os.getpid()
+        session = self._sessions.get(pid)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(pid)
+                if session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._sessions[pid] = session
+        return session
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _delay(self, attempt, response=None):
+        # Full jitter: uniform over [0, capped exponential backoff]
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff * 2 ** attempt))
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.backoff_cap))
+        return delay
+
+    def get_json(self, params, log_params=None):
+        """Decoded JSON response for the query params, or None if the request failed.
+
+        log_params is what to show in log messages (e.g. params without the API key).
+        """
+        key = json.dumps(params, sort_keys=True, default=str)
+        result, shared = self._single_flight.do(key, lambda: self._get(params, log_params or params))
+        if shared:
+            self._count('coalesced')
+        return result
+
+    def _get(self, params, log_params):
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                self._count('rejected')
+                logger.warning("%s: circuit open, not requesting %s", self.url, log_params)
+                return None
+
+            self._count('requests')
+            response = None
+            try:
+                response = self._session().get(self.url, params=params, timeout=self.timeout)
+            except requests.RequestException as e:
+                # The exception text includes the full request URL, query string (API key) and all
+                error = type(e).__name__
+            else:
+                if response.status_code == 200:
+                    try:
+                        data = response.json()
+                    except ValueError:
+                        error = "invalid JSON in response"
+                    else:
+                        self.breaker.record(True)
+                        return data
+                elif response.status_code not in RETRY_STATUSES:
+                    # The API is up but rejected the request (bad parameters or key): no retry
+                    self.breaker.record(True)
+                    logger.warning("%s returned %d for %s", self.url, response.status_code, log_params)
+                    return None
+                else:
+                    error = f"HTTP {response.status_code}"
+
+            self.breaker.record(False)
+            self._count('failures')
+            if attempt < self.retries:
+                self._count('retries')
+                delay = self._delay(attempt, response)
+                logger.info("%s: %s, retrying in %.2fs", self.url, error, delay)
+                self.sleep(delay)
+            else:
+                logger.warning("%s: %s after %d attempts for %s", self.url, error, attempt + 1, log_params)
+        return None
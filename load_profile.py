@@ -0,0 +1,89 @@
+"""Typical-year calendar and hourly (8760) household load profiles.
+
+The dashboard only asks for one monthly kWh and therms figure. Here that
+figure is spread over a typical year: month-to-month seasonality
+(data/load_seasonality.csv) scales each month, and a typical-day shape
+(data/load_shapes.csv) for the season and day type spreads each day over
+its 24 hours. Annual totals stay at 12 x the monthly input.
+
+The per-hour factors are computed once, so building a profile is a single
+multiplication and works for any array of households at once.
+"""
+import numpy as np
+import pandas as pd
+
+LOAD_SHAPES_PATH = 'data/load_shapes.csv'
+LOAD_SEASONALITY_PATH = 'data/load_seasonality.csv'
+
+HOURS_PER_YEAR = 8760
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+# Typical year starts on a Sunday (as 2023 did); weekdays are Monday=0 .. Sunday=6
+FIRST_WEEKDAY = 6
+
+# Months (0-indexed) that use the summer day shapes
+SUMMER_MONTHS = [5, 6, 7, 8]  # June-September
+
+# Hour-of-year index arrays
+MONTH_OF_HOUR = np.repeat(np.repeat(np.arange(12), DAYS_IN_MONTH), 24)
+HOUR_OF_DAY = np.tile(np.arange(24), 365)
+DAY_OF_YEAR = np.repeat(np.arange(365), 24)
+WEEKDAY_OF_HOUR = (DAY_OF_YEAR + FIRST_WEEKDAY) % 7
+WEEKEND = WEEKDAY_OF_HOUR >= 5
+MONTH_STARTS = np.concatenate(([0], np.cumsum(DAYS_IN_MONTH)[:-1])) * 24
+
+for _array in (MONTH_OF_HOUR, HOUR_OF_DAY, DAY_OF_YEAR, WEEKDAY_OF_HOUR, WEEKEND, MONTH_STARTS):
+    _array.flags.writeable = False
+
+
+def hourly_factors(day_shapes, monthly_weights, summer_months=SUMMER_MONTHS):
+    """Fraction of an average month's usage that falls in each hour of the year.
+
+    day_shapes maps (summer, weekend) -> 24 relative hourly values;
+    monthly_weights has 12 relative values. The result sums to 12.
+    """
+    monthly_weights = np.asarray(monthly_weights, dtype=float)
+    monthly_weights = monthly_weights / monthly_weights.mean()
+
+    summer = np.isin(MONTH_OF_HOUR, summer_months)
+    factors = np.empty(HOURS_PER_YEAR)
+    for (is_summer, is_weekend), shape in day_shapes.items():
+        shape = np.asarray(shape, dtype=float)
+        hours = (summer == is_summer) & (WEEKEND == is_weekend)
+        factors[hours] = (shape / shape.sum())[HOUR_OF_DAY[hours]]
+
+    # Every day of a month gets an equal share of that month's usage
+    factors *= (monthly_weights / DAYS_IN_MONTH)[MONTH_OF_HOUR]
+    factors.flags.writeable = False
+    return factors
+
+
+def load_hourly_factors(shapes_path=LOAD_SHAPES_PATH, seasonality_path=LOAD_SEASONALITY_PATH):
+    """Returns (electricity factors, gas factors), each an 8760 array."""
+    shapes = pd.read_csv(shapes_path).sort_values('hour')
+    seasonality = pd.read_csv(seasonality_path).sort_values('month')
+
+    elec = hourly_factors({
+        (True, False): shapes['elec_summer_weekday'], (True, True): shapes['elec_summer_weekend'],
+        (False, False): shapes['elec_winter_weekday'], (False, True): shapes['elec_winter_weekend'],
+    }, seasonality['elec'])
+    # Gas use follows the same daily pattern all year; seasonality does the rest
+    gas = hourly_factors({
+        (summer, False): shapes['gas_weekday'] for summer in (True, False)
+    } | {
+        (summer, True): shapes['gas_weekend'] for summer in (True, False)
+    }, seasonality['gas'])
+    return elec, gas
+
+
+ELEC_FACTORS, GAS_FACTORS = load_hourly_factors()
+
+
+def hourly_profile(monthly_usage, factors=ELEC_FACTORS):
+    """8760-hour profile(s) for average monthly usage; shape usage_shape + (8760,)."""
+    return np.asarray(monthly_usage, dtype=float)[..., np.newaxis] * factors
+
+
+def monthly_totals(hourly):
+    """Sums an (..., 8760) profile into (..., 12) calendar months."""
+    return np.add.reduceat(hourly, MONTH_STARTS, axis=-1)
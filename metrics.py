@@ -0,0 +1,351 @@
+"""Callback latency, stage timing, cache and external API metrics in Prometheus format.
+
+``instrument_callbacks(app)`` wraps every server-side callback registered
+with ``app.callback`` afterwards, recording its wall and CPU time and its
+errors. ``stage(name)`` times a part of a callback (geocode, solar, compute,
+figure), and ``register_metrics(server)`` serves everything on ``/metrics``:
+
+    dashboard_callback_seconds{callback}            histogram, wall time
+    dashboard_callback_cpu_seconds{callback}        histogram, CPU time of the calling thread
+    dashboard_callback_response_bytes{callback}     histogram, JSON sent to the browser
+    dashboard_callback_errors_total{callback}       counter (PreventUpdate is not an error)
+    dashboard_stage_seconds{callback,stage}         histogram
+    dashboard_cache_hits_total{cache}, dashboard_cache_misses_total{cache}, dashboard_cache_hit_ratio{cache}
+    dashboard_external_requests_total{service}, ..._failures_total, ..._retries_total,
+    ..._rejected_total, ..._coalesced_total, dashboard_external_error_ratio{service}
+
+Each process keeps its own metrics. Under a pre-fork server set METRICS_DIR
+to a directory the workers share: each worker writes its metrics there
+(at most every METRICS_FLUSH_INTERVAL seconds, and when it exits) and
+``/metrics`` adds up every worker's file, so a scrape sees the whole server
+whichever worker answers it. Files of workers that exited stay, so totals
+never go down while the server runs; a new worker that gets a dead worker's
+pid carries on from its counts. The directory must start empty for each
+server run: ``clear_metrics_dir()`` does that (wsgi.create_app calls it in
+the master before forking).
+
+Invocations run under the profiler (profiling.py) are counted in
+dashboard_callback_profiled_total instead of the latency histograms, which
+would otherwise include the profiler's overhead.
+"""
+import atexit
+import contextlib
+import contextvars
+import functools
+import glob
+import json
+import os
+import threading
+import time
+
+import dash
+from flask import Response, g, has_request_context
+
+from cache import reset_lock_after_fork
+
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name: (type, help, label names, histogram buckets)
+METRICS = {
+    'dashboard_callback_seconds': ('histogram', "Callback wall time", ('callback',), SECONDS_BUCKETS),
+    'dashboard_callback_cpu_seconds': ('histogram', "Callback CPU time", ('callback',), SECONDS_BUCKETS),
+    'dashboard_callback_response_bytes': ('histogram', "Callback response size", ('callback',), BYTES_BUCKETS),
+    'dashboard_callback_errors_total': ('counter', "Callbacks that raised", ('callback',), None),
+    'dashboard_callback_profiled_total': ('counter', "Profiled invocations, left out of the time histograms",
+                                          ('callback',), None),
+    'dashboard_stage_seconds': ('histogram', "Time in each stage of a callback", ('callback', 'stage'),
+                                SECONDS_BUCKETS),
+    'dashboard_cache_hits_total': ('counter', "Cache hits", ('cache',), None),
+    'dashboard_cache_misses_total': ('counter', "Cache misses", ('cache',), None),
+    'dashboard_external_requests_total': ('counter', "Requests sent to external APIs", ('service',), None),
+    'dashboard_external_failures_total': ('counter', "Failed external requests (after which a retry may follow)",
+                                          ('service',), None),
+    'dashboard_external_retries_total': ('counter', "Retried external requests", ('service',), None),
+    'dashboard_external_rejected_total': ('counter', "Calls refused by an open circuit breaker", ('service',), None),
+    'dashboard_external_coalesced_total': ('counter', "Calls served by an identical in-flight request",
+                                           ('service',), None),
+}
+# Gauges derived from the counters above at scrape time: numerator / sum of denominators
+RATIOS = {
+    'dashboard_cache_hit_ratio': ("Share of cache lookups that hit", 'cache', 'dashboard_cache_hits_total',
+                                  ('dashboard_cache_hits_total', 'dashboard_cache_misses_total')),
+    'dashboard_external_error_ratio': ("Share of external requests that failed", 'service',
+                                       'dashboard_external_failures_total', ('dashboard_external_requests_total',)),
+}
+
+_current_callback = contextvars.ContextVar('current_callback', default='')
+_skip_timing = contextvars.ContextVar('skip_timing', default=False)
+
+
+class _Store:
+    """This process's samples: (metric, label values) -> [bucket counts..., sum, count] or [value]."""
+
+    def __init__(self):
+        self.values = {}
+        self.last_flush = 0.0
+        self.adopted = False  # whether an earlier process's file for this pid has been read
+        self._lock = threading.Lock()
+        reset_lock_after_fork(self)
+
+    def after_fork(self):
+        # Samples from before the fork (e.g. the master's warm-up) would count once per worker
+        self.values = {}
+        self.last_flush = 0.0
+        self.adopted = False
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][3]
+        with self._lock:
+            series = self.values.get((name, labels))
+            if series is None:
+                series = self.values[(name, labels)] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            series = self.values.setdefault((name, labels), [0])
+            series[0] += amount
+
+
+_store = _Store()
+os.register_at_fork(after_in_child=_store.after_fork)
+
+
+def observe(name, value, *labels):
+    _store.observe(name, labels, value)
+
+
+def inc(name, *labels, amount=1):
+    _store.inc(name, labels, amount)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Times the enclosed block as a stage of the running callback."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if not _skip_timing.get():
+            observe('dashboard_stage_seconds', time.perf_counter() - started, _current_callback.get(), name)
+
+
+def skip_timing():
+    """Leaves the running callback's times out of the histograms, e.g. because it is being profiled."""
+    _skip_timing.set(True)
+
+
+def timed_callback(fn):
+    """Wraps a callback to record its wall time, CPU time and errors."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _current_callback.set(name)
+        skip_token = _skip_timing.set(False)
+        if has_request_context():
+            g.callback_name = name  # for the response size, measured once Dash has serialized the output
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            return fn(*args, **kwargs)
+        except dash.exceptions.PreventUpdate:
+            raise
+        except Exception:
+            inc('dashboard_callback_errors_total', name)
+            raise
+        finally:
+            if _skip_timing.get():
+                inc('dashboard_callback_profiled_total', name)
+            else:
+                observe('dashboard_callback_seconds', time.perf_counter() - wall, name)
+                observe('dashboard_callback_cpu_seconds', time.thread_time() - cpu, name)
+            _skip_timing.reset(skip_token)
+            _current_callback.reset(token)
+            _maybe_flush()
+
+    return wrapper
+
+
+def wrap_callbacks(app, wrapper):
+    """Makes ``app.callback`` register ``wrapper(fn)`` instead of each callback fn; call before registering any.
+
+    The decorated names keep referring to the plain functions, so they can
+    still be called directly (e.g. by benchmark.py) without the wrapper.
+    """
+    register = app.callback
+
+    def callback(*args, **kwargs):
+        decorator = register(*args, **kwargs)
+
+        def add(fn):
+            decorator(wrapper(fn))
+            return fn
+
+        return add
+
+    app.callback = callback
+
+
+def instrument_callbacks(app):
+    """Records the metrics above for every callback registered afterwards."""
+    wrap_callbacks(app, timed_callback)
+
+
+def _collected():
+    """Cache and external API counters, read from the objects that keep them."""
+    from callback_cache import callback_caches
+    from solar import hourly_cache, pvwatts_cache, pvwatts_client
+
+    counters = {}
+
+    def cache(label, hits, misses):
+        counters[('dashboard_cache_hits_total', (label,))] = [hits]
+        counters[('dashboard_cache_misses_total', (label,))] = [misses]
+
+    for name, callback_cache in callback_caches.items():
+        stats = callback_cache.stats
+        cache(f'callback:{name}', stats['hits'] + stats['disk_hits'], stats['misses'])
+    for label, tiered in (('pvwatts', pvwatts_cache), ('solar_hourly', hourly_cache)):
+        # Memory misses that the disk tier answered are hits overall
+        last = tiered.disk if tiered.disk is not None else tiered.memory
+        disk_hits = tiered.disk.hits if tiered.disk is not None else 0
+        cache(label, tiered.memory.hits + disk_hits, last.misses)
+
+    for stat, value in pvwatts_client.stats.items():
+        counters[(f'dashboard_external_{stat}_total', ('pvwatts',))] = [value]
+    return counters
+
+
+def _snapshot():
+    with _store._lock:
+        values = {key: list(series) for key, series in _store.values.items()}
+    return _add(values, _collected())
+
+
+def _read(path):
+    """{(metric, labels): series} from a worker's file."""
+    with open(path) as f:
+        return {(name, tuple(labels)): series for name, labels, series in json.load(f)}
+
+
+def _add(total, values):
+    for key, series in values.items():
+        summed = total.setdefault(key, [0] * len(series))
+        for i, value in enumerate(series):
+            summed[i] += value
+    return total
+
+
+def _flush():
+    path = os.path.join(METRICS_DIR, f'{os.getpid()}.json')
+    if not _store.adopted:
+        # A file for this pid is from an earlier worker of this run that exited:
+        # keep its counts, or the server's totals would drop
+        try:
+            earlier = _read(path)
+        except (OSError, ValueError):
+            earlier = {}
+        with _store._lock:
+            _add(_store.values, earlier)
+        _store.adopted = True
+    rows = [[name, list(labels), series] for (name, labels), series in _snapshot().items()]
+    with open(path + '.tmp', 'w') as f:
+        json.dump(rows, f)
+    os.replace(path + '.tmp', path)
+    _store.last_flush = time.monotonic()
+
+
+def _maybe_flush():
+    if METRICS_DIR and time.monotonic() - _store.last_flush >= METRICS_FLUSH_INTERVAL:
+        _flush()
+
+
+def _flush_at_exit():
+    # Keeps the counts since the last flush of a worker that is shutting down
+    if METRICS_DIR:
+        try:
+            _flush()
+        except OSError:
+            pass
+
+
+atexit.register(_flush_at_exit)
+
+
+def clear_metrics_dir():
+    """Removes every worker's file from METRICS_DIR; call once per server run, before workers start."""
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+        os.remove(path)
+    _store.adopted = True  # nothing left to carry on from
+
+
+def _merged():
+    """Every worker's samples added up (just this process's without METRICS_DIR)."""
+    if not METRICS_DIR:
+        return _snapshot()
+    _flush()
+    merged = {}
+    for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+        try:
+            _add(merged, _read(path))
+        except (OSError, ValueError):
+            continue  # being replaced
+    return merged
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def render(values):
+    """Prometheus text exposition format for merged samples."""
+    lines = []
+    for name, (kind, help_text, label_names, buckets) in METRICS.items():
+        series = sorted((labels, v) for (n, labels), v in values.items() if n == name)
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for labels, v in series:
+            if kind == 'counter':
+                lines.append(f"{name}{_labels(label_names, labels)} {v[0]}")
+                continue
+            for bound, count in zip(buckets, v):
+                lines.append(f"{name}_bucket{_labels(label_names, labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{_labels(label_names, labels, [('le', '+Inf')])} {v[-1]}")
+            lines.append(f"{name}_sum{_labels(label_names, labels)} {v[-2]}")
+            lines.append(f"{name}_count{_labels(label_names, labels)} {v[-1]}")
+
+    for name, (help_text, label_name, numerator, denominators) in RATIOS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for (n, labels), v in sorted(values.items()):
+            if n != numerator:
+                continue
+            total = sum(values.get((d, labels), [0])[0] for d in denominators)
+            if total:
+                lines.append(f"{name}{_labels((label_name,), labels)} {v[0] / total:.6g}")
+    return '\n'.join(lines) + '\n'
+
+
+def register_metrics(server):
+    """Adds GET /metrics and response size recording to a Flask server."""
+    @server.after_request
+    def record_response_size(response):
+        name = g.get('callback_name')
+        if name and response.content_length is not None:
+            observe('dashboard_callback_response_bytes', response.content_length, name)
+        return response
+
+    @server.route('/metrics')
+    def metrics():
+        return Response(render(_merged()), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,193 @@
+"""Monte Carlo uncertainty bands for the solar and electrification projections.
+
+The 20-year projection (projection.py) uses point estimates for panel
+degradation, electricity price escalation, the discount rate and the system
+cost. Here those, together with the household's usage, solar production,
+heat pump COP and gas price escalation, are drawn from the distributions in
+``DISTRIBUTIONS`` and every trial is evaluated in one vectorized batch.
+
+Trials run in chunks of ``CHUNK_TRIALS`` with independent seeds spawned from
+one ``SEED``, so results are reproducible and identical whether the chunks
+run in this process or across a process pool (``MONTE_CARLO_WORKERS``).
+"""
+import concurrent.futures
+import os
+
+import numpy as np
+
+from energy_calc import evaluate_plans
+from projection import (DISCOUNT_RATE, ELECTRICITY_INFLATION, HORIZON_YEARS, SOLAR_DEGRADATION,
+                        UP_FRONT_COST, cumulative_costs, payback_year)
+
+MONTE_CARLO_TRIALS = int(os.environ.get('MONTE_CARLO_TRIALS', 20000))
+# Processes to spread trials over; 0 runs them in the calling process
+MONTE_CARLO_WORKERS = int(os.environ.get('MONTE_CARLO_WORKERS', 0))
+CHUNK_TRIALS = 10000
+SEED = 20240601
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# name: (kind, parameters) for numpy's Generator.<kind>(*parameters)
+DISTRIBUTIONS = {
+    'degradation': ('normal', SOLAR_DEGRADATION, 0.002),
+    'inflation': ('normal', ELECTRICITY_INFLATION, 0.01),  # electricity tariff escalation
+    'gas_inflation': ('normal', 1.03, 0.015),              # gas tariff escalation
+    'discount': ('uniform', DISCOUNT_RATE - 0.01, DISCOUNT_RATE + 0.01),
+    'up_front_cost': ('triangular', 0.8 * UP_FRONT_COST, UP_FRONT_COST, 1.3 * UP_FRONT_COST),
+    'usage': ('normal', 1.0, 0.1),                         # x the entered usage
+    'production': ('normal', 1.0, 0.07),                   # x the estimated solar output
+    'cop': ('normal', 1.0, 0.12),                          # x the entered COP (field performance)
+}
+
+# Physical limits samples are clipped to
+BOUNDS = {
+    'degradation': (0.98, 1.0),
+    'usage': (0.5, 1.5),
+    'production': (0.5, 1.5),
+    'cop': (0.5, 1.5),
+}
+
+_executor = None
+_executor_workers = None
+
+
+def sample(n, rng, distributions=DISTRIBUTIONS):
+    """Draws n values of every parameter; returns {name: (n,) array}."""
+    samples = {}
+    for name, (kind, *params) in distributions.items():
+        values = getattr(rng, kind)(*params, size=n)
+        if name in BOUNDS:
+            values = np.clip(values, *BOUNDS[name])
+        samples[name] = values
+    return samples
+
+
+def solar_trials(samples, annual_cost, coverage, horizon=HORIZON_YEARS):
+    """Cumulative net savings from solar (n, horizon) and payback year (n,) per trial."""
+    usage = samples['usage']
+    # The system's output is fixed, so higher usage lowers the share it covers
+    trial_coverage = np.minimum(1.0, coverage * samples['production'] / usage)
+    _, cum_with, cum_without = cumulative_costs(
+        annual_cost * usage, trial_coverage, samples['up_front_cost'], samples['degradation'],
+        samples['inflation'], samples['discount'], horizon
+    )
+    return {
+        'net_savings': cum_without - cum_with,
+        'payback_year': payback_year(cum_with, cum_without),
+    }
+
+
+def electrification_trials(samples, kwh, therms, gas_allowance, price_per_kwh, gas_base_price, gas_excess_price,
+                           cop, furnace_eff, heater_eff, furnace_ratio, electrification_pct,
+                           horizon=HORIZON_YEARS):
+    """Cumulative operating savings from electrification (n, horizon) per trial.
+
+    Efficiencies, ratios and electrification_pct are fractions (0-1), as in evaluate_plans.
+    """
+    usage = samples['usage']
+    results = evaluate_plans(kwh * usage, therms * usage, gas_allowance, [price_per_kwh], [0.0],
+                             gas_base_price, gas_excess_price, cop=cop * samples['cop'],
+                             furnace_eff=furnace_eff, heater_eff=heater_eff, furnace_ratio=furnace_ratio,
+                             electrification_pct=electrification_pct)
+    added_electricity = 12 * (results['elec_cost_elec'] - results['elec_cost_orig'])  # (n, 1)
+    saved_gas = 12 * (results['gas_cost_orig'] - results['gas_cost_elec'])
+
+    years = np.arange(1, horizon + 1)
+    discount = samples['discount'][:, np.newaxis]
+    elec_growth = (samples['inflation'][:, np.newaxis] / discount) ** years
+    gas_growth = (samples['gas_inflation'][:, np.newaxis] / discount) ** years
+    return {'net_savings': np.cumsum(saved_gas * gas_growth - added_electricity * elec_growth, axis=-1)}
+
+
+def _run_chunk(trial_fn, n, seed_sequence, kwargs):
+    return trial_fn(sample(n, np.random.default_rng(seed_sequence)), **kwargs)
+
+
+def _get_executor(workers):
+    # One pool per process, created on first use and reused by later runs
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        _executor_workers = workers
+    return _executor
+
+
+def run_trials(trial_fn, n_trials=None, workers=None, seed=SEED, **kwargs):
+    """Runs trial_fn over n_trials sampled scenarios; returns its outputs concatenated over trials."""
+    n_trials = n_trials or MONTE_CARLO_TRIALS
+    workers = MONTE_CARLO_WORKERS if workers is None else workers
+
+    sizes = [CHUNK_TRIALS] * (n_trials // CHUNK_TRIALS)
+    if n_trials % CHUNK_TRIALS:
+        sizes.append(n_trials % CHUNK_TRIALS)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(trial_fn, n, seed_sequence, kwargs) for n, seed_sequence in zip(sizes, seeds)]
+
+    if workers and len(args) > 1:
+        chunks = list(_get_executor(workers).map(_run_chunk, *zip(*args)))
+    else:
+        chunks = [_run_chunk(*a) for a in args]
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+
+def percentile_bands(curves, percentiles=PERCENTILES):
+    """{percentile: curve} across trials (axis 0), interpolated like np.percentile.
+
+    One contiguous sort per year is about 3x faster than np.percentile along
+    the strided trial axis.
+    """
+    ordered = np.sort(np.ascontiguousarray(curves.T), axis=-1)
+    position = np.asarray(percentiles, dtype=float) / 100 * (ordered.shape[-1] - 1)
+    low = np.floor(position).astype(int)
+    high = np.minimum(low + 1, ordered.shape[-1] - 1)
+    weight = position - low
+    values = ordered[:, low] * (1 - weight) + ordered[:, high] * weight  # (years, percentiles)
+    return dict(zip(percentiles, values.T))
+
+
+def payback_distribution(payback, horizon=HORIZON_YEARS):
+    """(share of trials paying back in each year 1..horizon, share not paying back within it)."""
+    paid_back = payback[~np.isnan(payback)].astype(int)
+    share = np.bincount(paid_back, minlength=horizon + 1)[1:horizon + 1] / len(payback)
+    return share, 1.0 - share.sum()
+
+
+def _read_only(result):
+    # Results are memoized by the dashboard and shared between callers, so lock their arrays
+    for value in result.values():
+        arrays = value.values() if isinstance(value, dict) else [value]
+        for array in arrays:
+            if isinstance(array, np.ndarray):
+                array.setflags(write=False)
+    return result
+
+
+def solar_monte_carlo(annual_cost, coverage, n_trials=None, workers=None, horizon=HORIZON_YEARS):
+    """Percentile bands of cumulative net savings and the payback-year distribution for solar.
+
+    Returns a dict with 'years', 'bands' ({percentile: (horizon,)}),
+    'payback_share' (horizon,), 'no_payback_share' and 'n_trials'. Arrays
+    are read-only.
+    """
+    trials = run_trials(solar_trials, n_trials, workers, annual_cost=annual_cost, coverage=coverage,
+                        horizon=horizon)
+    payback_share, no_payback_share = payback_distribution(trials['payback_year'], horizon)
+    return _read_only({
+        'years': np.arange(1, horizon + 1),
+        'bands': percentile_bands(trials['net_savings']),
+        'payback_share': payback_share,
+        'no_payback_share': no_payback_share,
+        'n_trials': len(trials['payback_year']),
+    })
+
+
+def electrification_monte_carlo(n_trials=None, workers=None, horizon=HORIZON_YEARS, **household):
+    """Percentile bands of cumulative electrification savings; household as in electrification_trials."""
+    trials = run_trials(electrification_trials, n_trials, workers, horizon=horizon, **household)
+    return _read_only({
+        'years': np.arange(1, horizon + 1),
+        'bands': percentile_bands(trials['net_savings']),
+        'n_trials': len(trials['net_savings']),
+    })
@@ -0,0 +1,49 @@
+import numpy as np
+
+# Power mix columns in plan_details.csv, ordered non-renewables first then renewables
+# (same order the pie chart uses)
+MIX_COLUMNS = [
+    "Coal", "Large Hydroelectric", "Natural Gas", "Nuclear", "Non-Renewable_Others", "Unspecified Power",
+    "Biomass & Biowaste", "Geothermal", "Eligible Hydrelectric", "Solar", "Wind", "Renewable_Others"
+]
+
+
+def plan_dtype(plan_details_df):
+    """Record layout for one plan: name, price, emissions and the 12 mix columns."""
+    name_len = max(int(plan_details_df['plan'].str.len().max()), 1)
+    return np.dtype(
+        [('plan', f'U{name_len}'),
+         ('price_per_kwh', 'f8'),
+         ('emissions_g_per_kwh', 'f8')] +
+        [(col, 'f8') for col in MIX_COLUMNS]
+    )
+
+
+def build_plan_catalog(zip_to_plans, plan_details_df):
+    """Maps each ZIP code to a contiguous record array of its available plans.
+
+    Plans keep the row order of plan_details.csv, matching the old
+    `plan_details_df[plan_details_df['plan'].isin(available_plans)]` filter.
+    ZIPs that share the same plan set share the same (read-only) array.
+    """
+    dtype = plan_dtype(plan_details_df)
+    columns = ['plan', 'price_per_kwh', 'emissions_g_per_kwh'] + MIX_COLUMNS
+    all_plans = np.array(list(plan_details_df[columns].itertuples(index=False, name=None)), dtype=dtype)
+
+    blocks = {}
+    catalog = {}
+    for zip_code, available_plans in zip_to_plans.items():
+        key = frozenset(available_plans)
+        if key not in blocks:
+            block = np.ascontiguousarray(all_plans[np.isin(all_plans['plan'], list(key))])
+            block.flags.writeable = False
+            blocks[key] = block
+        catalog[zip_code] = blocks[key]
+
+    return catalog
+
+
+def plan_options(plans):
+    """Dropdown options and default value for a block of plans."""
+    options = [{'label': plan, 'value': plan} for plan in plans['plan'].tolist()]
+    return options, (options[0]['value'] if options else None)
@@ -0,0 +1,149 @@
+"""Power-mix pie charts, built once per plan.
+
+There are only a handful of plans, so every plan's grouped mix and pie figure
+are computed when the plan data is loaded. Showing a plan's mix is then a
+dictionary lookup. Rebuild with build_pie_figures whenever plan_details.csv
+is reloaded.
+"""
+import plotly.graph_objects as go
+
+from plan_catalog import MIX_COLUMNS
+
+# Display labels for MIX_COLUMNS, in the same order
+POWER_SOURCES = [
+    "Coal", "Large Hydroelectric", "Natural Gas", "Nuclear", "Non-Renewable Other", "Unspecified",
+    "Biomass & Biowaste", "Geothermal", "Eligible Hydroelectric", "Solar", "Wind", "Renewable Other"
+]
+
+# Color scheme: red-orange tones for non-renewables, green-blue for renewables
+COLORS = [
+    # Non-Renewables (darker tones)
+    "#4d0f00",  # Coal – dark reddish-brown
+    "#6b200c",  # Large Hydro (controversial) – dark clay
+    "#8b2c02",  # Natural Gas – rich dark orange
+    "#a63603",  # Nuclear – burnt orange
+    "#b15928",  # Non-Renewable Others – earthy brown
+    "#666666",  # Unspecified – dark neutral gray
+
+    # Renewables (clean, vibrant)
+    "#006d2c",  # Biomass – forest green
+    "#31a354",  # Geothermal – bright leaf green
+    "#74c476",  # Hydroelectric – mint green
+    "#fed976",  # Solar – soft yellow
+    "#6baed6",  # Wind – light sky blue
+    "#2171b5"   # Renewable Others – deeper blue
+]
+
+N_NON_RENEWABLE = 6
+SMALL_SLICE_THRESHOLD = 0.03  # slices under 3% are grouped into "Other"
+
+
+def group_mix(values):
+    """Groups small slices into "Other Non-Renewable" / "Other Renewable".
+
+    Returns (labels, values, colors) for the pie.
+    """
+    combined_labels = []
+    combined_values = []
+    combined_colors = []
+
+    non_renewable_small = 0
+    renewable_small = 0
+
+    for i, (source, value, color) in enumerate(zip(POWER_SOURCES, values, COLORS)):
+        if value < SMALL_SLICE_THRESHOLD:
+            if i < N_NON_RENEWABLE:
+                non_renewable_small += value
+            else:
+                renewable_small += value
+        else:
+            combined_labels.append(source)
+            combined_values.append(value)
+            combined_colors.append(color)
+
+    # Add combined categories if they exist
+    if non_renewable_small > 0:
+        combined_labels.append("Other Non-Renewable")
+        combined_values.append(non_renewable_small)
+        combined_colors.append("#969696")  # Gray
+
+    if renewable_small > 0:
+        combined_labels.append("Other Renewable")
+        combined_values.append(renewable_small)
+        combined_colors.append("#b3de69")  # Light green
+
+    return combined_labels, combined_values, combined_colors
+
+
+def renewable_split(values):
+    """(renewable %, non-renewable %) of the mix, rounded to whole percents."""
+    renewable_pct = sum(values[N_NON_RENEWABLE:])
+    non_renewable_pct = sum(values[:N_NON_RENEWABLE])
+    total = renewable_pct + non_renewable_pct
+
+    if total > 0:
+        renewable_pct = round((renewable_pct / total) * 100)
+        non_renewable_pct = round((non_renewable_pct / total) * 100)
+    return renewable_pct, non_renewable_pct
+
+
+def power_mix_figure(plan, values):
+    """Donut chart of a plan's power mix (values in MIX_COLUMNS order, as fractions)."""
+    labels, slice_values, colors = group_mix(values)
+    renewable_pct, non_renewable_pct = renewable_split(values)
+
+    pie_fig = go.Figure(data=[
+        go.Pie(
+            labels=labels,
+            values=slice_values,
+            hole=0.4,
+            marker=dict(colors=colors),
+            name=plan,
+            sort=False,
+            direction='clockwise',
+            rotation=0,  # Start at top
+            textinfo='percent',  # Show only percentages on the chart
+            textposition='inside',
+            textfont=dict(size=14, color='white'),
+            insidetextorientation='radial',
+            domain=dict(x=[0, 0.7])  # Fix chart width to 70% of figure
+        )
+    ])
+
+    pie_fig.update_layout(
+        title={
+            'text': f"Power Mix for {plan}<br><span style='font-size:18px;color:#2ca25f'>{renewable_pct}% Renewable</span> | <span style='font-size:18px;color:#d73027'>{non_renewable_pct}% Non-Renewable</span>",
+            'x': 0.5,
+            'xanchor': 'center',
+            'font': dict(size=22),
+            'y': 0.95
+        },
+        margin=dict(l=20, r=20, t=20, b=20),  # Increased bottom margin for legend
+        height=500,  # Increased height to accommodate bottom legend
+        legend=dict(
+            orientation='v',
+            x=0.85,       # Start legend at 75% of the width
+            y=0.5,
+            xanchor='left',
+            yanchor='middle',
+            font=dict(size=12),
+            bordercolor='lightgrey',
+            borderwidth=1,
+            bgcolor='rgba(255, 255, 255, 0.9)',
+            traceorder='normal'
+        ),
+        showlegend=True,
+        paper_bgcolor='white'
+    )
+
+    return pie_fig
+
+
+def build_pie_figures(plan_details_df):
+    """Maps each plan name to its pie figure as a plain (JSON-ready) dict."""
+    figures = {}
+    for plan, *values in plan_details_df[['plan'] + MIX_COLUMNS].itertuples(index=False, name=None):
+        # First row wins, like looking the plan up with .iloc[0]
+        if plan not in figures:
+            figures[plan] = power_mix_figure(plan, [float(v) for v in values]).to_dict()
+    return figures
@@ -0,0 +1,250 @@
+"""Opt-in profiling of live callbacks.
+
+A callback invocation is profiled when
+
+* its name is in PROFILE_CALLBACKS (comma-separated, ``*`` for every
+  callback), for every invocation; or
+* the request carries ``X-Profile: 1`` (or a comma-separated list of callback
+  names) and ``X-Admin-Token`` matches PROFILE_ADMIN_TOKEN. Without a token
+  configured, headers are ignored.
+
+PROFILE_MODE picks the profiler:
+
+* ``cprofile`` (default): deterministic, every function call is timed;
+  writes a ``.pstats`` file (open with ``python -m pstats`` or snakeviz).
+* ``sample``: a thread samples the callback's stack every
+  PROFILE_SAMPLE_INTERVAL seconds; writes a ``.collapsed`` file of
+  ``frame;frame;frame count`` lines for flame graph tools. Cheaper, and
+  closer to real timings for callbacks dominated by many small calls.
+
+Files go to PROFILE_DIR, named by time, callback, duration and process, and
+only the newest PROFILE_KEEP are kept. With PROFILE_ADMIN_TOKEN set (sent as
+``X-Admin-Token`` or ``?token=``):
+
+    GET /admin/profiles?n=20        the n slowest kept invocations, with their top functions
+    GET /admin/profiles/<file>      one profile (``?format=text`` for a pstats report)
+"""
+import cProfile
+import collections
+import functools
+import hmac
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+
+from flask import Response, abort, has_request_context, jsonify, request, send_from_directory
+
+from metrics import skip_timing
+
+PROFILE_CALLBACKS = {name.strip() for name in os.environ.get('PROFILE_CALLBACKS', '').split(',') if name.strip()}
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'cprofile')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '.cache/profiles')
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 200))
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.001))
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN', '')
+TOP_FUNCTIONS = 15
+
+PROFILE_FILE = re.compile(r'^(?P<time>\d{8}T\d{6}\.\d{3})-(?P<callback>\w+)-(?P<ms>\d+)ms-(?P<pid>\d+)'
+                          r'\.(?P<ext>pstats|collapsed)$')
+
+
+def _admin():
+    token = request.headers.get('X-Admin-Token') or request.args.get('token', '')
+    return bool(PROFILE_ADMIN_TOKEN) and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN)
+
+
+def _requested(name):
+    if '*' in PROFILE_CALLBACKS or name in PROFILE_CALLBACKS:
+        return True
+    if not PROFILE_ADMIN_TOKEN or not has_request_context():
+        return False
+    header = request.headers.get('X-Profile', '')
+    if not header or not _admin():
+        return False
+    names = {n.strip() for n in header.split(',')}
+    return bool(names & {'1', '*', name})
+
+
+class _SwitchInterval:
+    """Lowers the interpreter's thread switch interval while any sampler runs.
+
+    The setting is process-wide, so overlapping samplers (a threaded server)
+    share one override, and the original value comes back when the last ends.
+    """
+
+    def __init__(self):
+        self.users = 0
+        self.original = None
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The samplers were threads of the parent and don't exist here
+        self._lock = threading.Lock()
+        if self.users:
+            sys.setswitchinterval(self.original)
+        self.users = 0
+
+    def lower(self, interval):
+        with self._lock:
+            if not self.users:
+                self.original = sys.getswitchinterval()
+            self.users += 1
+            sys.setswitchinterval(min(sys.getswitchinterval(), interval))
+
+    def restore(self):
+        with self._lock:
+            self.users -= 1
+            if not self.users:
+                sys.setswitchinterval(self.original)
+
+
+_switch_interval = _SwitchInterval()
+
+
+class StackSampler:
+    """Counts the stacks of the calling thread below the current frame, sampled from a background thread."""
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._thread_id = threading.get_ident()
+        self._base = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None and frame is not self._base:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._base = sys._getframe(1)  # stacks start below the caller, at the profiled function
+        # The sampler only runs when the profiled thread releases the GIL, every 5 ms by default
+        _switch_interval.lower(self.interval)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        _switch_interval.restore()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _rotate():
+    files = sorted(f for f in os.listdir(PROFILE_DIR) if PROFILE_FILE.match(f))
+    for old in files[:max(0, len(files) - PROFILE_KEEP)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, old))
+        except FileNotFoundError:
+            pass  # another worker rotated it first
+
+
+def _path(name, seconds, ext):
+    now = time.time()
+    stamp = time.strftime('%Y%m%dT%H%M%S', time.localtime(now)) + f'.{int(now % 1 * 1000):03d}'
+    return os.path.join(PROFILE_DIR, f"{stamp}-{name}-{seconds * 1000:.0f}ms-{os.getpid()}.{ext}")
+
+
+def profiled_callback(fn):
+    """Wraps a callback to run it under the profiler when requested (see module docstring)."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _requested(name):
+            return fn(*args, **kwargs)
+
+        skip_timing()  # the profiler's overhead would skew the latency histograms
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        started = time.perf_counter()
+        if PROFILE_MODE == 'sample':
+            with StackSampler() as sampler:
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    with open(_path(name, time.perf_counter() - started, 'collapsed'), 'w') as f:
+                        f.write(sampler.collapsed())
+                    _rotate()
+
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(fn, *args, **kwargs)
+        finally:
+            profiler.dump_stats(_path(name, time.perf_counter() - started, 'pstats'))
+            _rotate()
+
+    return wrapper
+
+
+def top_functions(path, n=TOP_FUNCTIONS):
+    """The n most expensive entries of a profile: functions by cumulative time, or stacks by samples."""
+    if path.endswith('.collapsed'):
+        with open(path) as f:
+            rows = [line.rsplit(' ', 1) for line in f if line.strip()]
+        leaves = collections.Counter()
+        for stack, count in rows:
+            leaves[stack.rsplit(';', 1)[-1]] += int(count)
+        total = sum(leaves.values()) or 1
+        return [{'function': leaf, 'samples': count, 'share': round(count / total, 3)}
+                for leaf, count in leaves.most_common(n)]
+
+    stats = pstats.Stats(path)
+    entries = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:n]
+    return [{'function': f"{func} ({os.path.basename(file)}:{line})", 'calls': calls,
+             'total_s': round(total, 6), 'cumulative_s': round(cumulative, 6)}
+            for (file, line, func), (_, calls, total, cumulative, _) in entries]
+
+
+def slowest(n=20):
+    """The n slowest kept invocations (from every worker), slowest first."""
+    if n <= 0 or not os.path.isdir(PROFILE_DIR):
+        return []
+    found = [(PROFILE_FILE.match(f), f) for f in os.listdir(PROFILE_DIR)]
+    found = sorted(((m, f) for m, f in found if m), key=lambda mf: int(mf[0]['ms']), reverse=True)
+    invocations = []
+    for m, f in found:
+        try:
+            top = top_functions(os.path.join(PROFILE_DIR, f))
+        except (OSError, ValueError, EOFError):
+            continue  # rotated away or still being written
+        invocations.append({'file': f, 'callback': m['callback'], 'ms': int(m['ms']), 'time': m['time'],
+                            'pid': int(m['pid']), 'top': top})
+        if len(invocations) == n:
+            break
+    return invocations
+
+
+def register_profiling(server):
+    """Adds the /admin/profiles routes to a Flask server (404 unless PROFILE_ADMIN_TOKEN is set and sent)."""
+    @server.route('/admin/profiles')
+    def list_profiles():
+        if not _admin():
+            abort(404)
+        # Each listed profile is a pstats load, so n is capped at what can be kept
+        n = request.args.get('n', 20, type=int)
+        return jsonify(slowest(max(1, min(n, PROFILE_KEEP))))
+
+    @server.route('/admin/profiles/<filename>')
+    def get_profile(filename):
+        path = os.path.join(PROFILE_DIR, filename)
+        if not _admin() or not PROFILE_FILE.match(filename) or not os.path.exists(path):
+            abort(404)
+        if request.args.get('format') == 'text' and filename.endswith('.pstats'):
+            report = io.StringIO()
+            pstats.Stats(path, stream=report).sort_stats('cumulative').print_stats(60)
+            return Response(report.getvalue(), mimetype='text/plain')
+        return send_from_directory(os.path.abspath(PROFILE_DIR), filename)
@@ -0,0 +1,96 @@
+"""Vectorized long-term cost projection with and without solar.
+
+Year ``i`` (1-indexed) costs, in today's dollars:
+
+    without = annual_cost * (inflation / discount) ** i
+    with    = annual_cost * (1 - coverage * degradation ** i) * (inflation / discount) ** i
+
+and the with-solar total also includes the up-front cost. Every parameter may
+be a scalar or an array; they broadcast together, so one call evaluates a
+whole grid of scenarios. Curves carry a trailing year axis.
+"""
+import numpy as np
+
+SOLAR_DEGRADATION = 0.995     # panel output kept each year (0.5% degradation)
+ELECTRICITY_INFLATION = 1.022  # 2.2% annual electricity price increase
+DISCOUNT_RATE = 1.04           # 4% consumer discount rate
+UP_FRONT_COST = 10626
+HORIZON_YEARS = 20
+
+
+def _geometric_sum(ratio, n):
+    """sum(ratio ** i for i in 1..n), elementwise."""
+    ratio = np.asarray(ratio, dtype=float)
+    n = np.asarray(n, dtype=float)
+    near_one = np.isclose(ratio, 1.0)
+    safe = np.where(near_one, 0.5, ratio)
+    return np.where(near_one, n, safe * (1 - safe ** n) / (1 - safe))
+
+
+def cumulative_costs(annual_cost, coverage, up_front_cost=UP_FRONT_COST, degradation=SOLAR_DEGRADATION,
+                     inflation=ELECTRICITY_INFLATION, discount=DISCOUNT_RATE, horizon=HORIZON_YEARS):
+    """Cumulative cost curves for years 1..max(horizon).
+
+    coverage is the fraction (0-1) of usage covered by solar in year 0.
+    Returns (years, cum_with, cum_without); the curves have shape
+    broadcast(parameters) + (max(horizon),).
+    """
+    years = np.arange(1, int(np.max(horizon)) + 1)
+    annual_cost, coverage, up_front_cost, degradation, inflation, discount = (
+        np.asarray(x, dtype=float)[..., np.newaxis]
+        for x in (annual_cost, coverage, up_front_cost, degradation, inflation, discount)
+    )
+
+    growth = (inflation / discount) ** years
+    cum_without = np.cumsum(annual_cost * growth, axis=-1)
+    cum_with = np.cumsum(annual_cost * (1 - coverage * degradation ** years) * growth, axis=-1) + up_front_cost
+    return years, cum_with, cum_without
+
+
+def total_savings(annual_cost, coverage, up_front_cost=UP_FRONT_COST, degradation=SOLAR_DEGRADATION,
+                  inflation=ELECTRICITY_INFLATION, discount=DISCOUNT_RATE, horizon=HORIZON_YEARS):
+    """Total savings from solar over the horizon, from the closed-form geometric series."""
+    growth = np.asarray(inflation, dtype=float) / np.asarray(discount, dtype=float)
+    solar_share = _geometric_sum(growth * degradation, horizon)
+    return np.asarray(annual_cost, dtype=float) * np.asarray(coverage, dtype=float) * solar_share - up_front_cost
+
+
+def payback_year(cum_with, cum_without, horizon=None):
+    """First year (1-indexed) where the with-solar total drops below the without-solar total.
+
+    NaN where that doesn't happen within the horizon.
+    """
+    ahead = cum_with < cum_without
+    if horizon is not None:
+        years = np.arange(1, ahead.shape[-1] + 1)
+        ahead = ahead & (years <= np.asarray(horizon)[..., np.newaxis])
+    first = np.argmax(ahead, axis=-1) + 1.0
+    return np.where(ahead.any(axis=-1), first, np.nan)
+
+
+def sensitivity_grid(annual_cost, coverage, x_name, x_values, y_name, y_values, **params):
+    """Payback year and total savings over a 2-D grid of two parameters.
+
+    x_name / y_name are keyword names of cumulative_costs (e.g. 'inflation',
+    'up_front_cost'); the other parameters come from ``params`` or the
+    defaults. Returns a dict with 'x', 'y', 'payback_year' and
+    'total_savings', the latter two of shape (len(y_values), len(x_values)).
+    """
+    x_values = np.asarray(x_values, dtype=float)
+    y_values = np.asarray(y_values, dtype=float)
+    params = dict(params)
+    params[x_name] = x_values[np.newaxis, :]
+    params[y_name] = y_values[:, np.newaxis]
+    if 'horizon' in (x_name, y_name):
+        params['horizon'] = np.broadcast_to(params['horizon'], (len(y_values), len(x_values))).astype(int)
+
+    horizon = params.get('horizon', HORIZON_YEARS)
+    _, cum_with, cum_without = cumulative_costs(annual_cost, coverage, **params)
+    savings = total_savings(annual_cost, coverage, **params)
+    shape = (len(y_values), len(x_values))
+    return {
+        'x': x_values,
+        'y': y_values,
+        'payback_year': np.broadcast_to(payback_year(cum_with, cum_without, horizon), shape),
+        'total_savings': np.broadcast_to(savings, shape),
+    }
@@ -0,0 +1,116 @@
+"""Joint search over plans, electrification and solar size for the best options.
+
+Every combination of
+
+    plan                  every plan available in the ZIP             (P)
+    furnace electrified   share of the furnace's gas moved to a heat pump (A)
+    heater electrified    share of the water heater's gas moved to one    (B)
+    solar size            kW, up to what the roof supports             (S)
+
+is evaluated in one broadcast (P, A, B, S) NumPy grid. Electrifying each
+appliance separately covers both the overall electrification % and the
+furnace/water-heater split. Monthly cost is the electricity and gas bills
+plus the solar system's up-front cost spread over the projection horizon;
+solar output offsets grid electricity up to the household's usage.
+
+The Pareto frontier holds the options no other option beats on both monthly
+cost and emissions. A grid of ~100k combinations takes about 20 ms.
+"""
+import numpy as np
+
+from energy_calc import GAS_EMISSIONS_KG_PER_THERM, electrified_usage, tiered_gas_cost
+from projection import HORIZON_YEARS, UP_FRONT_COST
+
+ELECTRIFICATION_STEPS = np.linspace(0, 1, 41)   # 0-100% in 2.5% steps
+SOLAR_STEP_KW = 0.25
+SOLAR_EMISSIONS_G_PER_KWH = 45  # lifecycle emissions of solar PV
+# The projection's up-front cost is for the dashboard's default 4 kW system
+SOLAR_COST_PER_KW = UP_FRONT_COST / 4.0
+
+
+def search_grid(kwh, therms, gas_allowance, price_per_kwh, emissions_g_per_kwh, gas_base_price, gas_excess_price,
+                solar_kwh_per_kw, max_solar_kw, cop=4.0, furnace_eff=0.8, heater_eff=0.8, furnace_ratio=0.6,
+                electrification_steps=ELECTRIFICATION_STEPS, solar_step_kw=SOLAR_STEP_KW,
+                solar_cost_per_kw=SOLAR_COST_PER_KW):
+    """Monthly cost ($) and emissions (kg CO₂) of every combination.
+
+    solar_kwh_per_kw is the average monthly output of 1 kW of panels.
+    Efficiencies and furnace_ratio are fractions (0-1). Returns a dict with
+    the axes ('furnace_pct', 'heater_pct' in %, 'solar_kw') and 'cost',
+    'emissions' of shape (P, A, B, S).
+    """
+    price_per_kwh = np.asarray(price_per_kwh, dtype=float)[:, np.newaxis, np.newaxis, np.newaxis]
+    emissions_g_per_kwh = np.asarray(emissions_g_per_kwh, dtype=float)[:, np.newaxis, np.newaxis, np.newaxis]
+    furnace = np.asarray(electrification_steps, dtype=float)[:, np.newaxis, np.newaxis]  # (A, 1, 1)
+    heater = np.asarray(electrification_steps, dtype=float)[:, np.newaxis]               # (B, 1)
+    solar_kw = np.arange(0, max(float(max_solar_kw), 0) + 1e-9, solar_step_kw)          # (S,)
+
+    # Added kWh for the electrified share of each appliance's gas use
+    adjusted_kwh, _ = electrified_usage(kwh, therms, cop, furnace_eff, heater_eff,
+                                        furnace_ratio=furnace_ratio * furnace, electrification_pct=1.0,
+                                        heater_ratio=(1 - furnace_ratio) * heater)             # (A, B, 1)
+    remaining_therms = therms * (1 - furnace_ratio * furnace - (1 - furnace_ratio) * heater)  # (A, B, 1)
+
+    solar_used = np.minimum(adjusted_kwh, solar_kw * solar_kwh_per_kw)                      # (A, B, S)
+    grid_kwh = adjusted_kwh - solar_used
+    gas_cost = tiered_gas_cost(remaining_therms, gas_allowance, gas_base_price, gas_excess_price)
+    solar_cost = solar_kw * solar_cost_per_kw / (HORIZON_YEARS * 12)
+
+    return {
+        'furnace_pct': np.round(furnace.ravel() * 100, 1),
+        'heater_pct': np.round(heater.ravel() * 100, 1),
+        'solar_kw': solar_kw,
+        'cost': price_per_kwh * grid_kwh + (gas_cost + solar_cost),
+        'emissions': ((emissions_g_per_kwh * grid_kwh + SOLAR_EMISSIONS_G_PER_KWH * solar_used) / 1000
+                      + GAS_EMISSIONS_KG_PER_THERM * remaining_therms),
+    }
+
+
+def pareto_frontier(cost, emissions):
+    """Flat indices of the cost/emissions Pareto frontier, cheapest first."""
+    cost = np.ravel(cost)
+    emissions = np.ravel(emissions)
+    # Cheapest first, lower emissions first among equal costs
+    order = np.lexsort((emissions, cost))
+    sorted_emissions = emissions[order]
+    # A point is on the frontier if it has lower emissions than every cheaper point
+    best_before = np.minimum.accumulate(np.concatenate(([np.inf], sorted_emissions[:-1])))
+    return order[sorted_emissions < best_before]
+
+
+def recommend(plan_names, **grid_args):
+    """Pareto frontier and the cheapest, greenest and balanced options.
+
+    grid_args are passed to search_grid. Each option is a dict with 'plan',
+    'furnace_pct', 'heater_pct', 'solar_kw', 'cost' and 'emissions'; the
+    frontier is a dict of arrays with the same keys, cheapest first.
+    'balanced' minimizes the sum of cost and emissions, each scaled to 0-1
+    along the frontier.
+    """
+    grid = search_grid(**grid_args)
+    frontier = pareto_frontier(grid['cost'], grid['emissions'])
+    p, a, b, s = np.unravel_index(frontier, grid['cost'].shape)
+
+    options = {
+        'plan': np.asarray(plan_names)[p],
+        'furnace_pct': grid['furnace_pct'][a],
+        'heater_pct': grid['heater_pct'][b],
+        'solar_kw': grid['solar_kw'][s],
+        'cost': grid['cost'].ravel()[frontier],
+        'emissions': grid['emissions'].ravel()[frontier],
+    }
+
+    def scaled(x):
+        spread = x.max() - x.min()
+        return (x - x.min()) / spread if spread else np.zeros_like(x)
+
+    def option(i):
+        return {key: values[i].item() for key, values in options.items()}
+
+    return {
+        'n_combinations': grid['cost'].size,
+        'frontier': options,
+        'cheapest': option(0),
+        'greenest': option(-1),
+        'balanced': option(int(np.argmin(scaled(options['cost']) + scaled(options['emissions'])))),
+    }
@@ -0,0 +1,261 @@
+"""Bulk scoring of household files from the command line, without the web server.
+
+    python -m score households.csv -o results.csv --workers 8
+
+The input (CSV or Parquet) has one household per row with the batch API's
+fields (zip, kwh, therms, gas_allowance, cop, furnace_eff, heater_eff,
+furnace_ratio, electrification_pct) plus optional roof_sqft and
+solar_coverage; missing columns or cells use the dashboard defaults. It is
+read in chunks, so files of any size run in bounded memory.
+
+Every household is scored against each plan in its ZIP: costs and emissions
+before and after electrification (energy_calc.py) and solar savings (the
+Solar tab's offset and 20-year projection). The output (CSV or Parquet, by
+extension) gets one row per household and plan, written chunk by chunk in
+input order. Households whose ZIP has no plans get one row with an error.
+
+Progress and throughput are reported on stderr.
+"""
+import argparse
+import collections
+import concurrent.futures
+import functools
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from batch import (CHUNK_SIZE, DECIMALS, DEFAULTS, NUMERIC_FIELDS, RESULT_FIELDS, SOLAR_DEFAULTS, SOLAR_FIELDS,
+                   evaluate_columns, frame_columns, solar_savings)
+from data_registry import DataRegistry
+from geocode import zip_to_latlon
+from solar import fetch_solar_potential
+
+SOLAR_RESULT_FIELDS = ['solar_monthly_savings', 'solar_20yr_savings', 'solar_payback_year']
+
+# Rate data for this process (each worker loads its own copy)
+_snapshot = None
+
+
+def _init_worker():
+    global _snapshot
+    _snapshot = DataRegistry(reload_interval=0).get()
+
+
+@functools.lru_cache(maxsize=None)
+def solar_output_per_kw(zip_code):
+    """Average monthly kWh from 1 kW of panels at the Solar tab's default array settings (0 if unknown)."""
+    lat, lon = zip_to_latlon(zip_code)
+    if lat is None:
+        return 0.0
+    data = fetch_solar_potential(lat, lon, 1.0)
+    if not data or "outputs" not in data:
+        return 0.0
+    return data["outputs"]["ac_annual"] / 12
+
+
+def score_chunk(frame, first_row, id_column=None):
+    """Scores one chunk of households; returns the long-format result rows in input order."""
+    columns_out = [id_column or 'row', 'zip', 'plan'] + RESULT_FIELDS + SOLAR_RESULT_FIELDS + ['error']
+    if len(frame) == 0:  # a CSV with only a header
+        return pd.DataFrame(columns=columns_out)
+    columns = frame_columns(frame, NUMERIC_FIELDS + SOLAR_FIELDS, {**DEFAULTS, **SOLAR_DEFAULTS})
+    ids = frame[id_column].to_numpy() if id_column else np.arange(first_row, first_row + len(frame))
+    # 1 kW per 100 sq ft of roof, as on the Solar tab
+    output_per_kw = np.array([solar_output_per_kw(z) for z in columns['zip'].tolist()])
+    monthly_output = output_per_kw * columns['roof_sqft'] / 100
+
+    parts = []
+    for rows, plans, results in evaluate_columns(columns, _snapshot.plan_catalog,
+                                                  _snapshot.gas_base_price, _snapshot.gas_excess_price):
+        if plans is None:
+            parts.append(pd.DataFrame({
+                '_row': rows, 'zip': columns['zip'][rows], 'plan': '',
+                'error': np.char.add("No plans found for ZIP code ", columns['zip'][rows]),
+            }))
+            continue
+
+        n_plans = len(plans)
+        solar = solar_savings(columns['kwh'][rows], plans['price_per_kwh'],
+                              monthly_output[rows], columns['solar_coverage'][rows])
+        part = {
+            '_row': np.repeat(rows, n_plans),
+            'zip': np.repeat(columns['zip'][rows], n_plans),
+            'plan': np.tile(plans['plan'], len(rows)),
+        }
+        # Rounded like the batch API (cents, grams); also keeps CSV output small and fast to write
+        for field in RESULT_FIELDS:
+            part[field] = np.round(results[field], DECIMALS[field]).ravel()
+        for field in SOLAR_RESULT_FIELDS:
+            part[field] = np.round(solar[field], 2).ravel()
+        part['error'] = ''
+        parts.append(pd.DataFrame(part))
+
+    scored = pd.concat(parts, ignore_index=True).sort_values('_row', kind='stable')
+    scored.insert(0, id_column or 'row', ids[scored['_row'].to_numpy()])
+    return scored.reindex(columns=columns_out)
+
+
+def _score_task(frame, first_row, id_column, as_csv):
+    # Runs in a worker: formatting CSV there keeps the main process free to write
+    scored = score_chunk(frame, first_row, id_column)
+    return scored.to_csv(index=False, header=first_row == 0) if as_csv else scored
+
+
+def _is_parquet(path):
+    return os.path.splitext(path)[1].lower() in ('.parquet', '.pq')
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # optional dependency, only needed for Parquet files
+    except ImportError:
+        sys.exit("Reading or writing Parquet files needs pyarrow (pip install pyarrow).")
+    return pyarrow
+
+
+def count_rows(path):
+    """Number of households in the input, for progress reporting."""
+    if _is_parquet(path):
+        return _pyarrow().parquet.ParquetFile(path).metadata.num_rows
+    with open(path, 'rb') as f:
+        lines = sum(block.count(b'\n') for block in iter(lambda: f.read(1 << 20), b''))
+        if f.tell() == 0:
+            return 0
+        f.seek(-1, os.SEEK_END)
+        # Header line, plus a last line without a trailing newline
+        return max(0, lines - 1 + (f.read(1) != b'\n'))
+
+
+def check_input(path, id_column=None):
+    """Raises ValueError if the input has no header or lacks id_column."""
+    if _is_parquet(path):
+        names = _pyarrow().parquet.ParquetFile(path).schema_arrow.names
+    else:
+        try:
+            names = pd.read_csv(path, nrows=0).columns.tolist()
+        except pd.errors.EmptyDataError:
+            raise ValueError(f"{path} is empty.")
+    if id_column is not None and id_column not in names:
+        raise ValueError(f"id column {id_column!r} is not in {path}, whose columns are: {', '.join(names)}.")
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yields the input file as DataFrames of up to chunk_size households."""
+    if _is_parquet(path):
+        for batch in _pyarrow().parquet.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype={'zip': str})
+
+
+class ResultWriter:
+    """Appends result chunks (DataFrames, or CSV text already formatted) to a CSV or Parquet file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._parquet_writer = None
+        self._started = False
+
+    def write(self, frame):
+        if isinstance(frame, str):
+            with open(self.path, 'a' if self._started else 'w', newline='') as f:
+                f.write(frame)
+        elif _is_parquet(self.path):
+            pa = _pyarrow()
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pa.parquet.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='a' if self._started else 'w', header=not self._started, index=False)
+        self._started = True
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+def report(done, total, started):
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed else 0.0
+    progress = f"{done:,}/{total:,} households ({done / total:.0%})" if total else f"{done:,} households"
+    eta = f", about {(total - done) / rate:,.0f}s left" if total and rate and done < total else ""
+    print(f"{progress} in {elapsed:,.1f}s, {rate:,.0f} households/s{eta}", file=sys.stderr, flush=True)
+
+
+def score_file(input_path, output_path, workers=0, chunk_size=CHUNK_SIZE, id_column=None, quiet=False):
+    """Scores every household in input_path into output_path; returns the number of households."""
+    check_input(input_path, id_column)
+    total = count_rows(input_path)
+    writer = ResultWriter(output_path)
+    started = time.perf_counter()
+    done = 0
+
+    def finish(scored, n):
+        nonlocal done
+        writer.write(scored)
+        done += n
+        if not quiet:
+            report(done, total, started)
+
+    try:
+        if workers > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                # A few chunks in flight per worker keeps them busy without reading the whole file
+                pending = collections.deque()
+                as_csv = not _is_parquet(output_path)
+                first_row = 0
+                for frame in read_chunks(input_path, chunk_size):
+                    future = executor.submit(_score_task, frame, first_row, id_column, as_csv)
+                    pending.append((future, len(frame)))
+                    first_row += len(frame)
+                    if len(pending) >= 2 * workers:
+                        future, n = pending.popleft()
+                        finish(future.result(), n)
+                while pending:
+                    future, n = pending.popleft()
+                    finish(future.result(), n)
+        else:
+            _init_worker()
+            first_row = 0
+            for frame in read_chunks(input_path, chunk_size):
+                finish(score_chunk(frame, first_row, id_column), len(frame))
+                first_row += len(frame)
+    finally:
+        writer.close()
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m score', description=__doc__.split('\n\n')[0])
+    parser.add_argument('input', help="household file (.csv, or .parquet with pyarrow installed)")
+    parser.add_argument('-o', '--output', required=True, help="result file (.csv or .parquet)")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="worker processes (default 0: score in this process)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f"households per chunk (default {CHUNK_SIZE:,})")
+    parser.add_argument('--id-column', help="input column copied to the output to identify households "
+                                            "(default: a 0-based row number)")
+    parser.add_argument('--quiet', action='store_true', help="don't report progress")
+    args = parser.parse_args(argv)
+    try:
+        check_input(args.input, args.id_column)
+    except ValueError as e:
+        parser.error(str(e))
+
+    started = time.perf_counter()
+    try:
+        done = score_file(args.input, args.output, args.workers, args.chunk_size, args.id_column, args.quiet)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    elapsed = time.perf_counter() - started
+    print(f"Scored {done:,} households in {elapsed:,.1f}s ({done / elapsed if elapsed else 0:,.0f} households/s) "
+          f"-> {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
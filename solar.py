@@ -0,0 +1,165 @@
+"""Solar output estimates for the Solar tab.
+
+SOLAR_BACKEND selects where estimates come from:
+
+* ``local`` (default): the bundled model in solar_model.py, no network needed.
+* ``pvwatts``: the NREL PVWatts API. Responses are cached by their rounded
+  request parameters in a memory LRU backed by a SQLite file, so repeat
+  lookups don't hit the network or use up the API quota. Requests go
+  through a shared ``JSONClient`` (http_client.py) with connection pooling,
+  timeouts, retries, a circuit breaker and coalescing of identical requests.
+
+Both return the PVWatts response shape (``outputs.ac_monthly``/``ac_annual``).
+
+``fetch_hourly_production`` returns hour-by-hour output for net metering
+(PVWatts ``timeframe=hourly`` or the local model's 8760 hours). Each site
+configuration is stored once as a float32 array (35 KB) in its own cache.
+"""
+import os
+
+import numpy as np
+
+from cache import LRUCache, SQLiteCache, TieredCache, make_key
+from http_client import CircuitBreaker, JSONClient
+from solar_model import hourly_ac, simulate_pvwatts
+
+SOLAR_BACKEND = os.environ.get("SOLAR_BACKEND", "local")
+
+# PVWATTS_URL can point at a local stub server for testing
+PVWATTS_URL = os.environ.get("PVWATTS_URL", "https://developer.nrel.gov/api/pvwatts/v6.json")
+NREL_API_KEY = os.environ.get("NREL_API_KEY", "897BGzhguuFnqgrEN2wTzPijQrA2n9xUpwytM6H8")  # Use your own API key
+
+pvwatts_client = JSONClient(
+    PVWATTS_URL,
+    connect_timeout=float(os.environ.get("PVWATTS_CONNECT_TIMEOUT", 3.05)),
+    read_timeout=float(os.environ.get("PVWATTS_READ_TIMEOUT", 10)),
+    retries=int(os.environ.get("PVWATTS_RETRIES", 2)),
+    breaker=CircuitBreaker(max_failures=int(os.environ.get("PVWATTS_BREAKER_FAILURES", 5)),
+                           reset_after=float(os.environ.get("PVWATTS_BREAKER_RESET", 30))),
+)
+
+# Lat/lon are snapped to a grid this size (degrees), about the 4 km NSRDB cell
+GRID_DEG = float(os.environ.get("PVWATTS_GRID_DEG", 0.04))
+
+PVWATTS_CACHE_PATH = os.environ.get("PVWATTS_CACHE_PATH", ".cache/pvwatts.sqlite")
+PVWATTS_CACHE_TTL = float(os.environ.get("PVWATTS_CACHE_TTL", 30 * 24 * 3600))
+PVWATTS_CACHE_MAX_BYTES = int(os.environ.get("PVWATTS_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+pvwatts_cache = TieredCache(
+    LRUCache(maxsize=1024),
+    SQLiteCache(PVWATTS_CACHE_PATH, ttl=PVWATTS_CACHE_TTL, max_bytes=PVWATTS_CACHE_MAX_BYTES)
+    if PVWATTS_CACHE_PATH else None
+)
+
+SOLAR_HOURLY_CACHE_PATH = os.environ.get("SOLAR_HOURLY_CACHE_PATH", ".cache/solar_hourly.sqlite")
+
+
+def _pack_hourly(values):
+    return np.asarray(values, dtype=np.float32).tobytes()
+
+
+def _unpack_hourly(data):
+    return np.frombuffer(data, dtype=np.float32)  # read-only view of the stored bytes
+
+
+hourly_cache = TieredCache(
+    LRUCache(maxsize=256),
+    SQLiteCache(SOLAR_HOURLY_CACHE_PATH, ttl=PVWATTS_CACHE_TTL, max_bytes=PVWATTS_CACHE_MAX_BYTES,
+                dumps=_pack_hourly, loads=_unpack_hourly)
+    if SOLAR_HOURLY_CACHE_PATH else None
+)
+
+
+def _snap(value, step):
+    return round(round(float(value) / step) * step, 6)
+
+
+def check_array_settings(**settings):
+    """Raises ValueError naming any array setting that is missing (e.g. a cleared input)."""
+    missing = [name for name, value in settings.items() if value is None]
+    if missing:
+        raise ValueError(f"Missing array settings: {', '.join(missing)}.")
+
+
+def pvwatts_params(lat, lon, system_capacity_kw=4.0, azimuth=180, tilt=20,
+                   array_type=1, module_type=1, losses=14):
+    """Normalized request parameters; equal dicts always give the same PVWatts output."""
+    return {
+        "lat": _snap(lat, GRID_DEG),
+        "lon": _snap(lon, GRID_DEG),
+        "system_capacity": round(float(system_capacity_kw), 2),
+        "azimuth": round(float(azimuth)) % 360,
+        "tilt": round(float(tilt)),
+        "array_type": int(array_type),
+        "module_type": int(module_type),
+        "losses": round(float(losses), 1),
+    }
+
+
+def fetch_solar_potential(lat, lon, system_capacity_kw=4.0, azimuth=180, tilt=20,
+                          array_type=1, module_type=1, losses=14, backend=None):
+    """Estimated monthly and annual solar output from the configured backend."""
+    check_array_settings(lat=lat, lon=lon, system_capacity_kw=system_capacity_kw, azimuth=azimuth, tilt=tilt,
+                         array_type=array_type, module_type=module_type, losses=losses)
+    backend = backend or SOLAR_BACKEND
+    if backend == "local":
+        return simulate_pvwatts(lat, lon, system_capacity_kw, azimuth, tilt, array_type, module_type, losses)
+    if backend == "pvwatts":
+        return fetch_pvwatts(lat, lon, system_capacity_kw, azimuth, tilt, array_type, module_type, losses)
+    raise ValueError(f"Unknown SOLAR_BACKEND {backend!r}, expected 'local' or 'pvwatts'.")
+
+
+def fetch_pvwatts(lat, lon, system_capacity_kw=4.0, azimuth=180, tilt=20,
+                  array_type=1, module_type=1, losses=14):
+    """Fetches estimated solar output from NREL PVWatts API with custom params."""
+    params = pvwatts_params(lat, lon, system_capacity_kw, azimuth, tilt, array_type, module_type, losses)
+    key = make_key("pvwatts-v6-monthly", params)
+
+    data = pvwatts_cache.get(key)
+    if data is not None:
+        return data
+
+    data = request_pvwatts(params, "monthly")
+    # Only cache usable responses so transient API errors are retried
+    if data is not None and "outputs" in data and not data.get("errors"):
+        pvwatts_cache.set(key, data)
+    return data
+
+
+def request_pvwatts(params, timeframe):
+    """Calls the PVWatts API with normalized parameters; the JSON response, or None if the request failed."""
+    query = {**params, "dataset": "nsrdb", "timeframe": timeframe}
+    # The API key stays out of the logs
+    return pvwatts_client.get_json({"api_key": NREL_API_KEY, **query}, log_params=query)
+
+
+def fetch_hourly_production(lat, lon, system_capacity_kw=4.0, azimuth=180, tilt=20,
+                            array_type=1, module_type=1, losses=14, backend=None):
+    """AC output (kWh) for each of the 8760 hours of a typical year, as a read-only float32 array.
+
+    Returns None if PVWatts gives no usable hourly output.
+    """
+    check_array_settings(lat=lat, lon=lon, system_capacity_kw=system_capacity_kw, azimuth=azimuth, tilt=tilt,
+                         array_type=array_type, module_type=module_type, losses=losses)
+    backend = backend or SOLAR_BACKEND
+    params = pvwatts_params(lat, lon, system_capacity_kw, azimuth, tilt, array_type, module_type, losses)
+    key = make_key(f"solar-hourly-{backend}", params)
+
+    hourly = hourly_cache.get(key)
+    if hourly is not None:
+        return hourly
+
+    if backend == "local":
+        hourly = hourly_ac(params["lat"], params["lon"], params["system_capacity"], params["azimuth"],
+                           params["tilt"], params["array_type"], params["module_type"], params["losses"])
+    elif backend == "pvwatts":
+        data = request_pvwatts(params, "hourly")
+        if not data or data.get("errors") or len(data.get("outputs", {}).get("ac", [])) != 8760:
+            return None
+        hourly = np.asarray(data["outputs"]["ac"], dtype=float) / 1000  # W over one hour -> kWh
+    else:
+        raise ValueError(f"Unknown SOLAR_BACKEND {backend!r}, expected 'local' or 'pvwatts'.")
+
+    hourly = _unpack_hourly(_pack_hourly(hourly))
+    hourly_cache.set(key, hourly)
+    return hourly
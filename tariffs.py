@@ -0,0 +1,244 @@
+"""Declarative tariff definitions, compiled into billing schedules (billing.py).
+
+Tariffs are described in data/tariffs.json (a .yaml/.yml file works too when
+PyYAML is installed):
+
+    {
+      "seasons": {"summer": [6, 7, 8, 9], "winter": [1, 2, 3, 4, 5, 10, 11, 12]},
+      "baseline_territories": {"X": {"kWh": {"summer": 9.8, "winter": 9.7}}},
+      "electric": [
+        {
+          "name": "Example TOU",
+          "unit": "kWh",
+          "fixed_monthly": 0,
+          "rates": [
+            {"price": 0.40},
+            {"price": 0.52, "hours": [16, 21]},
+            {"price": 0.60, "hours": [16, 21], "seasons": ["summer"], "days": "weekdays"}
+          ],
+          "baseline": {"territory": "X"},
+          "tiers": [{"above": 1.0, "adder": 0.08}]
+        }
+      ],
+      "gas": [ ... same fields, "unit": "therm" ... ]
+    }
+
+``rates`` are applied in order, later entries overriding earlier ones for
+the hours they cover; together they must cover every hour. ``hours`` is
+[start, end) in local standard time and may wrap past midnight. ``days`` is
+"all" (default), "weekdays" or "weekends". ``seasons`` or ``months``
+(1-12) limit an entry to part of the year. ``baseline`` is a units/day
+allowance given directly as ``per_day`` (a number or a per-season dict) or
+through a territory. ``tiers`` add ``adder`` $/unit to usage above
+``above`` x the monthly baseline, so a tariff with tiers needs a baseline.
+
+Every "electric" entry replaces the flat tariff of the plan with the same
+name in plan_details.csv; plans without one get a flat tariff at their
+``price_per_kwh``. Wherever the dashboard needs one price per plan (bar
+charts, recommender, batch API) it uses the tariff's load-weighted average
+(``average_prices``), so both views price a plan the same way. "gas" holds exactly one tariff, the one the dashboard
+bills gas with.
+
+"net_metering" lists the policies that credit exported solar energy (see
+net_metering.py). A policy either credits exports at the plan's retail rate
+less a ``non_bypassable_charge`` ($/kWh, NEM 2.0 style) or, with
+``"retail_credit": false``, at its own hourly export ``rates`` (same fields
+as tariff rates; Net Billing Tariff style).
+"""
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from billing import energy_charges, make_schedule
+from load_profile import GAS_FACTORS, HOUR_OF_DAY, HOURS_PER_YEAR, MONTH_OF_HOUR, WEEKEND
+
+TARIFFS_PATH = 'data/tariffs.json'
+
+NetMeteringPolicy = namedtuple('NetMeteringPolicy', [
+    'name',
+    'description',
+    'retail_credit',    # exports earn the plan's retail rate for that hour
+    'export_tariff',    # Schedule of $/kWh added to each exported kWh's credit
+])
+
+DAYS = {
+    'all': np.ones(HOURS_PER_YEAR, dtype=bool),
+    'weekdays': ~WEEKEND,
+    'weekends': WEEKEND,
+}
+
+
+def read_tariff_file(path=TARIFFS_PATH):
+    """Parses a tariff file (JSON, or YAML if PyYAML is installed)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        if os.path.splitext(path)[1].lower() in ('.yaml', '.yml'):
+            import yaml  # optional dependency, only needed for YAML tariff files
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def _months(entry, seasons, tariff):
+    """0-indexed months an entry applies to (all months if unrestricted)."""
+    if 'months' in entry:
+        return [m - 1 for m in entry['months']]
+    if 'seasons' in entry:
+        try:
+            return [m - 1 for season in entry['seasons'] for m in seasons[season]]
+        except KeyError as e:
+            raise ValueError(f"Tariff '{tariff}': unknown season {e}.")
+    return list(range(12))
+
+
+def _hour_mask(entry, seasons, tariff):
+    mask = np.isin(MONTH_OF_HOUR, _months(entry, seasons, tariff))
+
+    days = entry.get('days', 'all')
+    if days not in DAYS:
+        raise ValueError(f"Tariff '{tariff}': days must be one of {sorted(DAYS)}, got {days!r}.")
+    mask &= DAYS[days]
+
+    if 'hours' in entry:
+        start, end = entry['hours']
+        if start <= end:
+            mask &= (HOUR_OF_DAY >= start) & (HOUR_OF_DAY < end)
+        else:  # wraps past midnight
+            mask &= (HOUR_OF_DAY >= start) | (HOUR_OF_DAY < end)
+    return mask
+
+
+def compile_rates(rates, seasons, tariff):
+    """$/unit for every hour of the year from a list of rate entries."""
+    energy_rate = np.full(HOURS_PER_YEAR, np.nan)
+    for entry in rates:
+        energy_rate[_hour_mask(entry, seasons, tariff)] = float(entry['price'])
+    if np.isnan(energy_rate).any():
+        raise ValueError(f"Tariff '{tariff}': rates don't cover every hour of the year.")
+    return energy_rate
+
+
+def compile_baseline(baseline, seasons, territories, unit, tariff):
+    """Baseline allowance (units/day) for each month."""
+    if not baseline:
+        return np.zeros(12)
+    if 'territory' in baseline:
+        try:
+            per_day = territories[baseline['territory']][unit]
+        except KeyError:
+            raise ValueError(f"Tariff '{tariff}': no {unit} baseline for territory {baseline['territory']!r}.")
+    else:
+        per_day = baseline['per_day']
+
+    if not isinstance(per_day, dict):
+        return np.full(12, float(per_day))
+    allowance = np.full(12, np.nan)
+    for season, value in per_day.items():
+        allowance[_months({'seasons': [season]}, seasons, tariff)] = float(value)
+    if np.isnan(allowance).any():
+        raise ValueError(f"Tariff '{tariff}': baseline doesn't cover every month.")
+    return allowance
+
+
+def compile_tariffs(specs, seasons=None, territories=None):
+    """Compiles a list of tariff definitions into one billing Schedule (one plan per tariff)."""
+    seasons = seasons or {}
+    territories = territories or {}
+    n_tiers = max((len(spec.get('tiers', [])) for spec in specs), default=0)
+
+    names = []
+    energy_rate = np.empty((len(specs), HOURS_PER_YEAR))
+    fixed_monthly = np.zeros(len(specs))
+    baseline_per_day = np.zeros((len(specs), 12))
+    # Unused tier slots add nothing (no adder)
+    tier_thresholds = np.zeros((len(specs), n_tiers))
+    tier_adders = np.zeros((len(specs), n_tiers))
+
+    for i, spec in enumerate(specs):
+        name = spec['name']
+        if spec.get('tiers') and not spec.get('baseline'):
+            raise ValueError(f"Tariff '{name}': tiers are multiples of the baseline, but it has no baseline.")
+        names.append(name)
+        energy_rate[i] = compile_rates(spec['rates'], seasons, name)
+        fixed_monthly[i] = float(spec.get('fixed_monthly', 0))
+        baseline_per_day[i] = compile_baseline(spec.get('baseline'), seasons, territories, spec.get('unit', 'kWh'), name)
+        for k, tier in enumerate(spec.get('tiers', [])):
+            tier_thresholds[i, k] = float(tier['above'])
+            tier_adders[i, k] = float(tier['adder'])
+
+    return make_schedule(names, energy_rate, fixed_monthly, baseline_per_day, tier_thresholds, tier_adders)
+
+
+def flat_tariff_specs(plan_details_df):
+    """One flat per-kWh tariff per row of plan_details.csv."""
+    return [{'name': plan, 'unit': 'kWh', 'rates': [{'price': price}]}
+            for plan, price in zip(plan_details_df['plan'].tolist(), plan_details_df['price_per_kwh'].tolist())]
+
+
+def load_tariffs(plan_details_df, path=TARIFFS_PATH):
+    """Returns (electricity Schedule with one plan per plan_details.csv row, gas Schedule)."""
+    definitions = read_tariff_file(path)
+    seasons = definitions.get('seasons', {})
+    territories = definitions.get('baseline_territories', {})
+
+    # Explicit definitions replace the flat tariff built from plan_details.csv
+    overrides = {spec['name']: spec for spec in definitions.get('electric', [])}
+    unknown = sorted(set(overrides) - set(plan_details_df['plan']))
+    if unknown:
+        raise ValueError(f"{path}: electric tariffs {unknown} don't match any plan in plan_details.csv.")
+    electric = [overrides.get(spec['name'], spec) for spec in flat_tariff_specs(plan_details_df)]
+
+    gas = definitions.get('gas', [])
+    if len(gas) != 1:
+        raise ValueError(f"{path} must define exactly one gas tariff, got {len(gas)}.")
+
+    return (compile_tariffs(electric, seasons, territories),
+            compile_tariffs(gas, seasons, territories))
+
+
+def average_prices(schedule, factors):
+    """Load-weighted $/unit of every tariff in a schedule over a typical-year load shape.
+
+    This is the single price the monthly model (energy_calc.py) bills with, so
+    a TOU tariff is priced by when a typical household uses energy. Tier
+    adders depend on each household's usage and are only in hourly bills.
+    """
+    usage, energy = energy_charges(factors, schedule)
+    return energy.sum(axis=-1) / usage.sum()
+
+
+def two_tier_prices(schedule, factors=GAS_FACTORS, index=0):
+    """(base, excess) $/unit of a tariff for the monthly two-tier gas model in energy_calc.py.
+
+    The base price is the tariff's load-weighted average rate (average_prices);
+    the excess price adds its first tier adder.
+    """
+    base = float(average_prices(schedule, factors)[index])
+    adders = schedule.tier_adders[index]
+    return base, base + (float(adders[0]) if len(adders) else 0.0)
+
+
+def compile_net_metering(specs, seasons=None):
+    """Compiles "net_metering" definitions into {name: NetMeteringPolicy}."""
+    policies = {}
+    for spec in specs:
+        name = spec['name']
+        retail_credit = bool(spec.get('retail_credit', True))
+        if retail_credit:
+            # Retail credit less the non-bypassable charges, every hour
+            rates = [{'price': -float(spec.get('non_bypassable_charge', 0))}]
+        else:
+            rates = spec['rates']
+        policies[name] = NetMeteringPolicy(
+            name=name,
+            description=spec.get('description', ''),
+            retail_credit=retail_credit,
+            export_tariff=compile_tariffs([{'name': name, 'rates': rates}], seasons),
+        )
+    return policies
+
+
+def load_net_metering(path=TARIFFS_PATH):
+    """{name: NetMeteringPolicy} for the policies defined in a tariff file."""
+    definitions = read_tariff_file(path)
+    return compile_net_metering(definitions.get('net_metering', []), definitions.get('seasons', {}))
@@ -0,0 +1,99 @@
+"""Production entry point for pre-fork WSGI servers.
+
+    gunicorn --workers 4 --bind 0.0.0.0:8050 'wsgi:create_app()'
+
+(gunicorn.conf.py, read from the working directory, turns on ``--preload``.)
+
+``create_app`` runs once in the master process (with ``--preload``) and
+builds everything the workers read before they are forked: the rate data
+snapshot (plan catalog, ZIP index, tariff schedules, pie figures), the ZIP
+centroids and solar normals, and Plotly/Dash's lazily imported validators,
+warmed by rendering each bar chart and the page once. It then moves
+everything allocated so far into the garbage collector's permanent
+generation (``gc.freeze``).
+
+Workers share those pages copy-on-write. NumPy buffers are never written
+and frozen objects are no longer touched by the collector, so a worker adds
+only its own working set (about 13 MB) rather than its own copy of the data.
+Without ``--preload`` every worker builds its own copy.
+
+Callbacks are CPU-bound Python, so throughput scales with worker processes,
+not threads: run one worker per core and leave MONTE_CARLO_WORKERS at 0 so
+workers don't start process pools of their own. Rate data is reloaded in
+the master, not the workers: ``watch_data`` (started by gunicorn.conf.py)
+polls the files every DATA_RELOAD_INTERVAL seconds, loads and freezes a new
+snapshot when they change, and sends the master SIGHUP. gunicorn then forks
+fresh workers, which share the new snapshot, and retires the old ones
+gracefully. Without ``--preload`` each worker watches the files itself.
+The SQLite cache tiers (PVWatts, hourly solar) are shared by all workers
+through the cache files.
+"""
+import gc
+import logging
+import os
+import signal
+import threading
+import time
+
+from data_registry import registry
+from metrics import clear_metrics_dir
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up(app2):
+    # The first figure pulls in Plotly's validators and the first page render
+    # Dash's component registry; doing both here keeps them in shared memory.
+    # The undecorated callbacks run, so figures get built even if the disk cache has them
+    zip_code = next((z for z, plans in registry.preload().plan_catalog.items() if len(plans)), None)
+    if zip_code is not None:
+        app2.update_bar.__wrapped__(zip_code, 500, 30, 1.3, 'tab-base')
+        app2.update_bar_electrification.__wrapped__('tab-electrification', zip_code, 500, 30, 1.3,
+                                                    4, 80, 80, 60, 100)
+    client = app2.app.server.test_client()
+    for path in ('/', '/_dash-layout', '/_dash-dependencies'):
+        client.get(path)
+
+
+def create_app():
+    """The dashboard's Flask server, with shared data built and frozen for forking."""
+    import app2
+
+    registry.preload()
+    # Reloads happen in the master (watch_data); workers never start a watcher of their own
+    reload_interval, registry.reload_interval = registry.reload_interval, 0
+    try:
+        warm_up(app2)
+    finally:
+        registry.reload_interval = reload_interval
+
+    # Worker metric files of an earlier run would be added to this run's totals
+    clear_metrics_dir()
+    freeze()
+    return app2.app.server
+
+
+def freeze():
+    # Objects of a replaced snapshot are in the permanent generation too; unfreezing frees them
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+
+
+def watch_data(master_pid, interval):
+    """Reloads changed rate data in the master and has gunicorn replace the workers."""
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                changed = registry.reload()
+            except Exception:
+                # Half-written or invalid files: the workers keep the current snapshot
+                logger.exception("Reloading rate data failed; keeping version %d", registry.preload().version)
+                continue
+            if changed:
+                freeze()
+                # gunicorn forks new workers from the master (and its new snapshot) on SIGHUP
+                os.kill(master_pid, signal.SIGHUP)
+
+    threading.Thread(target=watch, name='data-registry-watcher', daemon=True).start()
@@ -0,0 +1,115 @@
+"""ZIP -> rate plan table, built from the ZIP/CCA list in data/zip_code_data.csv.
+
+Every ZIP gets the plans of each CCA that serves it (some ZIPs, such as
+94014, are split between two CCAs), followed by the PG&E plans. The result is
+stored as a compact binary artifact (data/zip_plans.npz):
+
+    zips       sorted ZIP codes                    (n,)
+    offsets    start of each ZIP's plans           (n + 1,)
+    plan_ids   indices into plan_names, per ZIP    (offsets[-1],)
+    plan_names all plan names                      (n_plans,)
+
+The artifact records a hash of its inputs and is only rebuilt when they
+change. Run ``python zip_plans.py`` to rebuild it by hand.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+ZIP_CCA_PATH = 'data/zip_code_data.csv'
+ZIP_PLANS_PATH = 'data/zip_plans.npz'
+
+# Define plan mappings for each CCA
+CCA_PLAN_MAP = {
+    "San Jose Clean Energy": ["SJCE GreenSource", "SJCE Total Green"],
+    "Silicon Valley Clean Energy": ["SVCE GreenStart", "SVCE GreenPrime"],
+    "Ava Community Energy": ["Ava Bright Choice", "Ava Renewable 100"],
+    "CleanPowerSF": ["CleanPowerSF SuperGreen", "CleanPowerSF Green"],
+    "Peninsula Clean Energy": ["PCE Ecoplus", "PCE Eco100"],
+    "MCE Clean Energy": ["MCE Light Green", "MCE Deep Green"],
+    "Sonoma Clean Power": ["Sonoma Clean Power CleanStart", "Sonoma Clean Power EverGreen"],
+}
+
+# PG&E plans added to all ZIPs
+PGE_PLANS = ["PG&E Base Plan", "PG&E 50% Solar Choice"]
+
+
+def source_hash(csv_path=ZIP_CCA_PATH):
+    """SHA-256 of the ZIP/CCA list and the plan mappings it is combined with."""
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        digest.update(f.read())
+    digest.update(json.dumps([CCA_PLAN_MAP, PGE_PLANS], sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def build_zip_plans(csv_path=ZIP_CCA_PATH):
+    """Returns the artifact arrays (zips, offsets, plan_ids, plan_names) for a ZIP/CCA list."""
+    df = pd.read_csv(csv_path, dtype=str).iloc[:, :2]
+    df.columns = ['zip', 'cca']
+    df['zip'] = df['zip'].str.strip()
+    df = df.drop_duplicates().reset_index(drop=True)
+
+    # One row per (ZIP, CCA plan), in file order; unknown CCAs contribute no plans
+    cca_plans = df.assign(plan=df['cca'].map(CCA_PLAN_MAP)).explode('plan').dropna(subset=['plan'])
+    pge_plans = pd.DataFrame({'zip': np.repeat(df['zip'].unique(), len(PGE_PLANS))})
+    pge_plans['plan'] = np.tile(PGE_PLANS, len(pge_plans) // len(PGE_PLANS))
+
+    rows = pd.concat([cca_plans[['zip', 'plan']], pge_plans], ignore_index=True)
+    rows = rows.drop_duplicates().sort_values('zip', kind='stable')
+
+    plan_names = list(dict.fromkeys([p for plans in CCA_PLAN_MAP.values() for p in plans] + PGE_PLANS))
+    plan_ids = pd.Categorical(rows['plan'], categories=plan_names).codes.astype(np.int16)
+
+    zips, counts = np.unique(rows['zip'].to_numpy(dtype=str), return_counts=True)
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int32)
+    return zips, offsets, plan_ids, np.array(plan_names)
+
+
+def write_zip_plans(arrays, digest, path=ZIP_PLANS_PATH):
+    """Writes the artifact arrays atomically, so readers never see a partial file."""
+    zips, offsets, plan_ids, plan_names = arrays
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, zips=zips, offsets=offsets, plan_ids=plan_ids, plan_names=plan_names,
+                 source_hash=np.array(digest))
+    os.replace(tmp_path, path)
+
+
+def read_zip_plans(path=ZIP_PLANS_PATH, digest=None):
+    """Artifact arrays, or None if the file is missing, unreadable or built from other sources."""
+    try:
+        with np.load(path, allow_pickle=False) as artifact:
+            if digest is not None and str(artifact['source_hash']) != digest:
+                return None
+            return artifact['zips'], artifact['offsets'], artifact['plan_ids'], artifact['plan_names']
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def load_zip_plans(path=ZIP_PLANS_PATH, csv_path=ZIP_CCA_PATH):
+    """Loads the ZIP -> plan names mapping, rebuilding the artifact first if it is stale."""
+    digest = source_hash(csv_path)
+    arrays = read_zip_plans(path, digest)
+    if arrays is None:
+        arrays = build_zip_plans(csv_path)
+        try:
+            write_zip_plans(arrays, digest, path)
+        except OSError:
+            pass  # read-only checkout: use the fresh build without saving it
+
+    zips, offsets, plan_ids, plan_names = arrays
+    zips = zips.tolist()
+    offsets = offsets.tolist()
+    plans = plan_names[plan_ids].tolist()
+    return {zip_code: plans[start:end] for zip_code, start, end in zip(zips, offsets[:-1], offsets[1:])}
+
+
+if __name__ == '__main__':
+    digest = source_hash()
+    arrays = build_zip_plans()
+    write_zip_plans(arrays, digest)
+    print(f"Wrote {ZIP_PLANS_PATH}: {len(arrays[0])} ZIP codes, {len(arrays[2])} ZIP/plan pairs (source {digest[:12]})")